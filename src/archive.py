@@ -0,0 +1,205 @@
+'''
+Compact binary archive of games, replayed without parsing any notation.
+
+Turning the standard notation of a PGN file into moves is the slowest part
+of reading it, so `write_archive` does it once and stores each game as its
+header tags and the packed 16-bit code of each of its moves (see
+`chess.encode_move`).  `GameArchive` memory-maps the file, and replays a
+game by applying its codes to the starting board with `make_move`.
+
+All numbers are little-endian.  The file is laid out as:
+
+* a header: `MAGIC`, the format version and number of games (uint32 each),
+  and the byte offset of the offset table (uint64).
+* each game in turn: the byte length of its headers and its number of moves
+  (uint32 each), its header tags as UTF-8 JSON padded with spaces to an even
+  length, then its moves (uint16 each).
+* the offset table: the byte offset of each game (uint64 each).
+'''
+import os
+import json
+import mmap
+import struct
+from array import array
+from chess import *
+from game import make_move, fen_to_board
+from read_pgn import HistoricalGame, read_indexed_game, pgn_files
+from pgn_index import load_index, little_endian
+
+MAGIC = b'CHESSARC'
+ARCHIVE_VERSION = 1
+ARCHIVE_SUFFIX = '.arc'
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq -'
+
+_file_header = struct.Struct('<8sIIQ')
+_game_header = struct.Struct('<II')
+
+class _RecordingGame(HistoricalGame):
+    '''
+    `HistoricalGame` which packs each move as it is played.
+    '''
+    def __init__(self, result, moves):
+        HistoricalGame.__init__(self, result, moves)
+        self.codes = array('H')
+
+    def getNextMove(self, team):
+        response = HistoricalGame.getNextMove(self, team)
+        if response:
+            (start, end), enpassant, promotion = response
+            # Castling moves count rows from the far side of the board as
+            # negative (see `setCoord`)
+            r1, c1, r2, c2 = (int(x) % 9 for x in (*start, *end))
+            self.codes.append(encode_move((promotion or 0, r1, c1, r2, c2), self.board))
+        return response
+
+def write_archive(fname, archive_name, select = None, verbose = 0):
+    '''
+    Converts the PGN file `fname` to an archive saved as `archive_name`.
+
+    INPUT
+    select -- as for `read_pgn.read_games`, to archive only some games
+
+    RETURN
+    written, failed -- number of games archived, and of games left out
+        because they could not be replayed
+    '''
+    offsets = array('Q')
+    failed = 0
+    with open(fname, 'rb') as pgn, open(archive_name, 'wb') as out:
+        out.write(bytes(_file_header.size))
+        index = load_index(fname)
+        every = index.headers()
+        for number in index.numbers(0, select):
+            headers = every[number]
+            for result, moves in read_indexed_game(pgn, *index[number]):
+                game = _RecordingGame(result, moves)
+                try:
+                    game.replay()
+                except IndexError:
+                    if verbose: print("failed on game ", number)
+                    failed += 1
+                    continue
+                tags = dict(headers)
+                tags.setdefault('Result', result)
+                text = json.dumps(tags).encode()
+                text += b' ' * (len(text) % 2)
+                offsets.append(out.tell())
+                out.write(_game_header.pack(len(text), len(game.codes)))
+                out.write(text)
+                out.write(little_endian(game.codes).tobytes())
+        table = out.tell()
+        out.write(little_endian(offsets).tobytes())
+        out.seek(0)
+        out.write(_file_header.pack(MAGIC, ARCHIVE_VERSION, len(offsets), table))
+    return len(offsets), failed
+
+class ArchivedGame:
+    def __init__(self, headers, codes):
+        '''
+        INPUT
+        headers -- dictionary of the game's tag pairs
+        codes -- array('H') of the game's packed moves
+        '''
+        self.headers = headers
+        self.codes = codes
+        self.result = headers.get('Result', '').split('-')[0]
+        self.states = None
+
+    def replay(self):
+        '''
+        Plays the game through the first time it is called, as
+        `HistoricalGame.replay` does.
+
+        RETURN
+        states -- list of board states from the start of the game to its end
+        '''
+        if self.states is None:
+            board, team = fen_to_board(START_FEN)
+            self.states = [board.copy()]
+            for code in self.codes:
+                make_move(board, code, team)
+                self.states.append(board.copy())
+                team = -team
+        return self.states
+
+class GameArchive:
+    def __init__(self, fname):
+        '''
+        Opens the archive `fname`, written by `write_archive`, for reading.
+        Only its offset table is read up front; games are read from the
+        memory-mapped file as they are asked for.
+        '''
+        self.file = open(fname, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count, table = _file_header.unpack_from(self.data)
+        if magic != MAGIC or version != ARCHIVE_VERSION:
+            self.close()
+            raise ValueError("{0} is not a game archive of version {1}".format(fname, ARCHIVE_VERSION))
+        self.offsets = little_endian(array('Q', self.data[table:table + 8*count]))
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def headers(self, i):
+        '''
+        RETURN
+        * dictionary of the tag pairs of game `i`
+        '''
+        offset = self.offsets[i]
+        text_length, _ = _game_header.unpack_from(self.data, offset)
+        start = offset + _game_header.size
+        return json.loads(self.data[start:start + text_length])
+
+    def moves(self, i):
+        '''
+        RETURN
+        * array('H') of the packed moves of game `i`
+        '''
+        offset = self.offsets[i]
+        text_length, plies = _game_header.unpack_from(self.data, offset)
+        start = offset + _game_header.size + text_length
+        return little_endian(array('H', self.data[start:start + 2*plies]))
+
+    def game(self, i):
+        return ArchivedGame(self.headers(i), self.moves(i))
+
+    def games(self, start_count = 0, max_count = 0, select = None):
+        '''
+        INPUT
+        start_count, max_count, select -- as for `read_pgn.read_games`
+
+        YIELD
+        game -- `ArchivedGame` for each game chosen, in order
+        '''
+        yielded = 0
+        for i in range(start_count, len(self)):
+            headers = self.headers(i)
+            if select and not select(headers):
+                continue
+            yield ArchivedGame(headers, self.moves(i))
+            yielded += 1
+            if yielded == max_count:
+                return
+
+def run_archive(path, archive_name = None, verbosity = 0, select = None):
+    '''
+    Converts each PGN file named by `path` (see `read_pgn.pgn_files`) to an
+    archive saved alongside it, with `ARCHIVE_SUFFIX` in place of `.pgn`.
+    `archive_name` instead names the archive of a single file.
+
+    RETURN
+    * fraction of games archived
+    '''
+    written = failed = 0
+    files = pgn_files(path)
+    for fname in files:
+        name = archive_name if archive_name and len(files) == 1 else os.path.splitext(fname)[0] + ARCHIVE_SUFFIX
+        file_written, file_failed = write_archive(fname, name, select, verbosity)
+        print("{0}: {1} games archived to {2}, {3} failed".format(fname, file_written, name, file_failed))
+        written += file_written
+        failed += file_failed
+    return written / (written + failed) if written + failed else 0
@@ -0,0 +1,97 @@
+'''
+Precomputed attack tables, built once at import.
+
+For every square these tables hold the squares a knight, king or pawn attacks
+from it, and the squares along each sliding ray in the order a rook, bishop or
+queen would reach them.  They come in two forms:
+
+* target lists of `(row, col, index)` entries, where `index` is the
+  `(col-1, row-1)` position of that square in an (8,8) array board.  These are
+  indexed `table[row][col]` with `row` and `col` on [1,8] and are used by the
+  move generators in `chess.py`.
+* 64-bit masks indexed by square `sq = 8*(row-1) + (col-1)`, used by
+  `bitboard.py`.
+
+Every target is already on the board, so no bounds checks are needed when
+walking them.
+'''
+
+diags = [(-1,-1), (-1,1), (1,-1), (1,1)]
+lrup = [(1,0), (0,1), (-1,0), (0,-1)]
+knight_jumps = [(x,y) for x in (-2,-1,1,2) for y in (-2,-1,1,2) if abs(x) != abs(y)]
+
+# Pawns attack towards the opposing back rank, so the pawn tables are keyed by
+# team (`Wh` = 1 moves up the board, `Bl` = -1 moves down).
+pawn_captures = {1: [(1,-1), (1,1)], -1: [(-1,-1), (-1,1)]}
+
+def square(row, col):
+    '''
+    Maps a (row, col) pair on [1,8] to a square index on [0,63].
+
+    NOTE
+    * the result is always a python int, since coordinates pulled out of
+    numpy arrays would otherwise overflow once shifted into a bitboard.
+    '''
+    return int(8*(row-1) + col-1)
+
+square_to_coord = [(sq//8 + 1, sq%8 + 1) for sq in range(64)]
+
+def squares(board):
+    '''
+    INPUT
+    board -- array shaped (8,8) containing a board state
+
+    RETURN
+    * iterator over the (square index, piece) of every square of `board`,
+    empty ones included, in square-index order (a1, b1, ..., h8)
+    '''
+    # Transposing puts the array in square-index order
+    return enumerate(board.T.ravel().tolist())
+
+def _target(row, col):
+    return (row, col, (col-1, row-1))
+
+def _jump_targets(offsets):
+    '''
+    RETURN
+    table -- table[row][col] lists the targets one jump away through each of
+        `offsets` which stay on the board
+    '''
+    table = [[None]*9 for _ in range(9)]
+    for row, col in square_to_coord:
+        table[row][col] = [_target(row+dr, col+dc) for dr, dc in offsets
+                if 1 <= row+dr <= 8 and 1 <= col+dc <= 8]
+    return table
+
+def _ray_targets(row, col, direction):
+    targets = []
+    r, c = row + direction[0], col + direction[1]
+    while 1 <= r <= 8 and 1 <= c <= 8:
+        targets.append(_target(r, c))
+        r, c = r + direction[0], c + direction[1]
+    return targets
+
+def _mask(targets):
+    mask = 0
+    for row, col, _ in targets:
+        mask |= 1 << square(row, col)
+    return mask
+
+knight_targets = _jump_targets(knight_jumps)
+king_targets = _jump_targets(diags + lrup)
+pawn_attack_targets = {team: _jump_targets(offsets) for team, offsets in pawn_captures.items()}
+
+# rays[row][col][direction] lists the squares along `direction`, nearest first.
+rays = [[None]*9 for _ in range(9)]
+for _row, _col in square_to_coord:
+    rays[_row][_col] = {d: _ray_targets(_row, _col, d) for d in diags + lrup}
+
+knight_masks = [_mask(knight_targets[row][col]) for row, col in square_to_coord]
+king_masks = [_mask(king_targets[row][col]) for row, col in square_to_coord]
+pawn_attack_masks = {team: [_mask(table[row][col]) for row, col in square_to_coord]
+        for team, table in pawn_attack_targets.items()}
+ray_masks = {d: [_mask(rays[row][col][d]) for row, col in square_to_coord] for d in diags + lrup}
+
+# Whether a ray runs towards increasing square indices, which decides whether
+# its first blocker is the lowest or the highest set bit of a mask.
+ray_positive = {d: 8*d[0] + d[1] > 0 for d in diags + lrup}
@@ -0,0 +1,61 @@
+'''
+Search benchmark over a fixed suite of positions.
+
+Each position of `perft.POSITIONS` is searched to the same depth with the
+selective search techniques switched on one at a time, so the nodes each
+saves can be compared against the plain alpha-beta search.
+'''
+import time
+from play import *
+from perft import POSITIONS
+
+DEFAULT_DEPTH = 4
+
+# (name, Engine options) of each configuration, the first being the baseline
+CONFIGURATIONS = [
+        ('plain', {'null_move': 0, 'lmr': 0}),
+        ('null move', {'null_move': NULL_MOVE_REDUCTION, 'lmr': 0}),
+        ('lmr', {'null_move': 0, 'lmr': LMR_REDUCTION}),
+        ('both', {'null_move': NULL_MOVE_REDUCTION, 'lmr': LMR_REDUCTION}),
+        ]
+
+def bench(depth, configurations = CONFIGURATIONS, positions = POSITIONS):
+    '''
+    RETURN
+    results -- results[name][position name] is the (move, score, nodes,
+        seconds) of that configuration's search of that position
+    '''
+    results = {}
+    for name, options in configurations:
+        results[name] = {}
+        for position, fen, _ in positions:
+            board, team = fen_to_board(fen)
+            engine = Engine(**options)
+            start = time.perf_counter()
+            move, score = engine.think(board, team, depth)
+            elapsed = time.perf_counter() - start
+            results[name][position] = (show_move(move, board), score, engine.nodes, elapsed)
+    return results
+
+def run_bench(depth = None, verbose = 0):
+    '''
+    Prints the nodes searched by each configuration on each position, and
+    the total saved relative to the first configuration.
+
+    RETURN
+    results -- as returned by `bench`
+    '''
+    depth = depth or DEFAULT_DEPTH
+    results = bench(depth)
+    baseline = CONFIGURATIONS[0][0]
+    base_nodes = sum(r[2] for r in results[baseline].values())
+    for name, _ in CONFIGURATIONS:
+        if verbose:
+            for position, (move, score, nodes, elapsed) in results[name].items():
+                print("{0:>10} {1:>10}: {2:>8} {3:8.2f} {4:>8} nodes {5:6.2f}s".format(
+                    name, position, move, score, nodes, elapsed))
+        nodes = sum(r[2] for r in results[name].values())
+        elapsed = sum(r[3] for r in results[name].values())
+        print("{0:>10} depth {1}: {2:>8} nodes {3:7.2f}s, {4:5.1f}% fewer nodes than {5}".format(
+            name, depth, nodes, elapsed, 100*(1 - nodes / base_nodes), baseline))
+    return results
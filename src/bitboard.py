@@ -0,0 +1,257 @@
+'''
+Bitboard representation of a board state.
+
+A `BitBoard` holds one 64-bit integer per signed piece code, in which bit `sq`
+is set when that piece stands on square `sq`.  Squares are indexed so that
+`sq = 8*(row-1) + (col-1)`, i.e. a1 is bit 0, h1 is bit 7 and h8 is bit 63.
+Occupancy masks for each team are kept alongside, as well as a 64-entry
+mailbox so the piece on a given square can be looked up directly.
+
+Moves are generated as the same 5-tuples produced by `chess.possible_moves`,
+and boards can be converted to and from the (8,8) int8 array layout used in
+the rest of the code, so callers can swap between the two freely.
+'''
+import numpy as np
+from chess import *
+from attacks import *
+
+FULL = (1 << 64) - 1
+
+piece_codes = [team*p for team in (Wh, Bl) for p in (P, fP, R, N, B, Q, K)]
+
+# Each ray is stored with a flag saying whether it points towards increasing
+# square indices, which decides whether its first blocker is the lowest or
+# highest set bit.
+diag_rays = [(ray_masks[d], ray_positive[d]) for d in diags]
+straight_rays = [(ray_masks[d], ray_positive[d]) for d in lrup]
+
+def slide(sq, occupied, rays):
+    '''
+    INPUT
+    sq -- square index the sliding piece stands on
+    occupied -- bitboard of every occupied square
+    rays -- either `diag_rays`, `straight_rays` or their concatenation
+
+    RETURN
+    attacks -- bitboard of squares reached along `rays` from `sq`, stopping at
+        (and including) the first occupied square on each ray
+    '''
+    attacks = 0
+    for masks, positive in rays:
+        ray = masks[sq]
+        blockers = ray & occupied
+        if blockers:
+            if positive:
+                first = (blockers & -blockers).bit_length() - 1
+            else:
+                first = blockers.bit_length() - 1
+            ray ^= masks[first]
+        attacks |= ray
+    return attacks
+
+def _move_table(piece, masks):
+    '''
+    For each square, builds the list of (target bit, 5-tuple) pairs for a
+    `piece` standing there, so generators never allocate move tuples.
+    '''
+    return [[(1 << to, (piece,) + square_to_coord[sq] + square_to_coord[to])
+             for to in iterate_bits(masks[sq])] for sq in range(64)]
+
+def iterate_bits(bb):
+    '''
+    YIELD
+    * the index of each set bit of `bb`, lowest first
+    '''
+    while bb:
+        lsb = bb & -bb
+        yield lsb.bit_length() - 1
+        bb ^= lsb
+
+
+all_rays = diag_rays + straight_rays
+move_tables = {N: _move_table(N, knight_masks),
+               K: _move_table(K, king_masks),
+               B: _move_table(B, [slide(sq, 0, diag_rays) for sq in range(64)]),
+               R: _move_table(R, [slide(sq, 0, straight_rays) for sq in range(64)]),
+               Q: _move_table(Q, [slide(sq, 0, all_rays) for sq in range(64)])}
+
+
+class BitBoard:
+    def __init__(self):
+        '''
+        Creates an empty board.  Use `BitBoard.fromArray` to build one from an
+        (8,8) array board state.
+        '''
+        self.pieces = {code: 0 for code in piece_codes}
+        self.occupancy = {Wh: 0, Bl: 0}
+        self.mailbox = [empty]*64
+
+    @classmethod
+    def fromArray(cls, board):
+        '''
+        INPUT
+        board -- array shaped (8,8) containing a board state
+
+        RETURN
+        * BitBoard holding the same position
+        '''
+        bitboard = cls()
+        for sq, code in squares(board):
+            if code != empty:
+                bitboard.setSquare(sq, code)
+        return bitboard
+
+    def toArray(self):
+        '''
+        RETURN
+        board -- array shaped (8,8) of int8 holding the same position
+        '''
+        board = np.zeros((8,8), dtype=np.int8)
+        for sq, code in enumerate(self.mailbox):
+            if code != empty:
+                board[sq % 8, sq // 8] = code
+        return board
+
+    def copy(self):
+        other = BitBoard()
+        other.pieces = self.pieces.copy()
+        other.occupancy = self.occupancy.copy()
+        other.mailbox = self.mailbox[:]
+        return other
+
+    def onBoard(self, row, col):
+        '''
+        Same contract as `chess.on_board`.
+        '''
+        if 1 <= row <= 8 and 1 <= col <= 8:
+            return self.mailbox[square(row, col)]
+        return None
+
+    def setSquare(self, sq, code):
+        '''
+        Places `code` (possibly `empty`) on square index `sq`, keeping the
+        piece bitboards, occupancy masks and mailbox consistent.
+        '''
+        bit = 1 << sq
+        old = self.mailbox[sq]
+        if old != empty:
+            self.pieces[old] ^= bit
+            self.occupancy[Wh if old > 0 else Bl] ^= bit
+        if code != empty:
+            self.pieces[code] |= bit
+            self.occupancy[Wh if code > 0 else Bl] |= bit
+        self.mailbox[sq] = code
+
+    def possibleMoves(self, team, pieceloc = None):
+        '''
+        INPUT
+        team -- specifier for team, either `Wh` or `Bl`
+        pieceloc -- if left `None` then all possible moves from all pieces on
+            the board on the specified `team` are computed.  Else, only
+            `pieceloc`'s moves are computed
+
+        RETURN
+        moves -- a list holding the same 5-tuples as the output of
+            `chess.possible_moves` on the equivalent array board
+
+        NOTE
+        * as with `chess.possible_moves`, this function does not remove moves
+        which reveal checks illegally, or moves that fail to respond to an
+        active check threat.
+        '''
+        own = self.occupancy[team]
+        enemy = self.occupancy[-team]
+        occupied = own | enemy
+        not_own = ~own & FULL
+        pieces = self.pieces
+        restrict = 1 << square(*pieceloc) if pieceloc else FULL
+
+        moves = []
+
+        # Pawns
+        step = 8*team
+        promotion_row = backrank[-team] - team
+        double_row = backrank[team] + team
+        attack_masks = pawn_attack_masks[team]
+        for sq in iterate_bits((pieces[team*P] | pieces[team*fP]) & restrict):
+            row, col = square_to_coord[sq]
+            targets = []
+            if not occupied >> (sq + step) & 1:
+                targets.append(sq + step)
+                if row == double_row and not occupied >> (sq + 2*step) & 1:
+                    moves.append((P, row, col, row + 2*team, col))
+            targets.extend(iterate_bits(attack_masks[sq] & enemy))
+            for to in targets:
+                to_row, to_col = square_to_coord[to]
+                if row == promotion_row:
+                    for p_code in promotion_pieces:
+                        moves.append((p_code, row, col, to_row, to_col))
+                else:
+                    moves.append((P, row, col, to_row, to_col))
+
+        # Knights and kings
+        for piece in (N, K):
+            table = move_tables[piece]
+            for sq in iterate_bits(pieces[team*piece] & restrict):
+                moves.extend([move for bit, move in table[sq] if bit & not_own])
+
+        # Sliding pieces
+        for piece, rays in ((B, diag_rays), (R, straight_rays), (Q, all_rays)):
+            table = move_tables[piece]
+            for sq in iterate_bits(pieces[team*piece] & restrict):
+                targets = slide(sq, occupied, rays) & not_own
+                moves.extend([move for bit, move in table[sq] if bit & targets])
+        return moves
+
+    def isSquareAttacked(self, sq, by_team):
+        '''
+        Same contract as `chess.is_square_attacked`, but for a square index.
+        '''
+        pieces = self.pieces
+        occupied = self.occupancy[Wh] | self.occupancy[Bl]
+        queens = pieces[by_team*Q]
+        return bool(
+            knight_masks[sq] & pieces[by_team*N] or
+            pawn_attack_masks[-by_team][sq] & (pieces[by_team*P] | pieces[by_team*fP]) or
+            king_masks[sq] & pieces[by_team*K] or
+            slide(sq, occupied, diag_rays) & (pieces[by_team*B] | queens) or
+            slide(sq, occupied, straight_rays) & (pieces[by_team*R] | queens))
+
+    def movePiece(self, start, end, team, enpassant = False, promotion = None):
+        '''
+        Given a start and end coordinates (2-lists) and a team distinction, the
+        board gets updated exactly as `game.movePiece` updates an array board.
+        '''
+        # Regardless of any other movements, all fresh pawns are converted to
+        # regular pawns.
+        for sq in iterate_bits(self.pieces[team*fP]):
+            self.setSquare(sq, team*P)
+
+        start_sq = square(*start)
+        end_sq = square(*end)
+        piece = self.mailbox[start_sq]
+
+        #Special case of a promotion
+        if end[0] == backrank[-team] and piece == team*P:
+            self.setSquare(end_sq, team*promotion)
+
+        # In the case of double-moving pawn (special case to allow en'passant on it)
+        elif piece == team*P and abs(end[0] - start[0]) == 2:
+            self.setSquare(end_sq, team*fP)
+        else:
+            self.setSquare(end_sq, piece)
+
+        # Remove the pawn that has been en'passanted
+        if enpassant:
+            self.setSquare(square(end[0] - team, end[1]), empty)
+        self.setSquare(start_sq, empty)
+
+        #Handles the rook move in the case of castling
+        if piece == team*K and abs(end[1] - start[1]) > 1:
+            br = backrank[team]
+            if end[1] == 7:
+                self.setSquare(square(br, 6), team*R)
+                self.setSquare(square(br, 8), empty)
+            elif end[1] == 3:
+                self.setSquare(square(br, 4), team*R)
+                self.setSquare(square(br, 1), empty)
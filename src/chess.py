@@ -1,5 +1,7 @@
 #from game import *
 import numpy as np
+from array import array
+from attacks import *
 
 
 Wh = 1
@@ -32,14 +34,24 @@ piece_to_string = {
 pieceStrToVal = {'F':fP,'P':P,'R':R,'N':N,'B':B,'Q':Q,'K':K,'O':C}
 pieceValToStr = {v:k for k,v in pieceStrToVal.items()}
 
+# Pieces a pawn may become when it reaches the opposing back rank.
+promotion_pieces = (Q, R, B, N)
+
+# Packed moves are 16-bit integers laid out as
+#   bits 0-5   square the move starts from (see `attacks.square`)
+#   bits 6-11  square the move ends on
+#   bits 12-13 index into `promotion_pieces`, only used by promotions
+#   bits 14-15 one of the flags below
+MOVE_NORMAL = 0
+MOVE_PROMOTION = 1
+MOVE_ENPASSANT = 2
+MOVE_CASTLING = 3
+
 backrank = {Wh:1, Bl:8}
 teams = {n:'White' for n in range(9)}
 teams.update({n:'Black' for n in range(-10,0)})
 teamStrToVal = {'W':Wh,'B':Bl}
 
-diags = [(-1,-1), (-1,1), (1,-1), (1,1)]
-lrup = [(1,0), (0,1), (-1,0), (0,-1)]
-
 def diffs(board1, board2):
     '''
     INPUT
@@ -298,9 +310,11 @@ def is_castling(start, end, team, moves, verbose=0):
             print(on_board(end,backrank[team],files['kt']) == team*K)
             print(on_board(end,backrank[team],files['rt']) == team*R)
 
-        # This boolean verifies the team is not in check and the king and rook 
-        # are in the correct places before and after the move
-        castling[i] = bool(not is_in_check(start, team) and
+        # This boolean verifies the king and rook are in the correct places
+        # before and after the move, and that the king neither starts in check
+        # nor passes over an attacked square (the rook's destination).  The
+        # attack tests come last so they only run for actual castling moves.
+        castling[i] = bool(
         (K,backrank[team],files['kf']) in moves['movefrom'] and
         (R,backrank[team],files['rf']) in moves['movefrom'] and
         (K,backrank[team],files['kt']) in moves['moveto'] and
@@ -308,7 +322,9 @@ def is_castling(start, end, team, moves, verbose=0):
         on_board(start,backrank[team],files['rf']) == team*R and
         on_board(start,backrank[team],files['kf']) == team*K and
         on_board(end,backrank[team],files['kt']) == team*K and
-        on_board(end,backrank[team],files['rt']) == team*R)
+        on_board(end,backrank[team],files['rt']) == team*R and
+        not is_square_attacked(start, (backrank[team],files['kf']), -team) and
+        not is_square_attacked(start, (backrank[team],files['rt']), -team))
 
     if verbose: print("castling: ", castling)    
     return sum(castling) == 1
@@ -364,14 +380,67 @@ def is_in_check(board, team, verbose=0):
     '''
     Given the board state, determines whether team's king is threatened.
     '''
-    # List of all moves the opponent can make.
-    threats = possible_moves(board, -team)
+    king = find_king(board, team)
     if verbose > 1:
-        print([move_to_string(*th) for th in threats])
+        print("king at ", king)
+    if king is None:
+        return False
+    return is_square_attacked(board, king, -team)
+
+def find_king(board, team):
+    '''
+    RETURN
+    * (row, col) of `team`'s king on `board`, or `None` if it is missing
+    '''
+    locs = np.flatnonzero(board == team*K)
+    if len(locs) == 0:
+        return None
+    col, row = divmod(int(locs[0]), 8)
+    return row+1, col+1
+
+def is_square_attacked(board, square, by_team):
+    '''
+    INPUT
+    board -- array shaped (8,8) containing a board state
+    square -- (row, col) on [1,8] of the square in question
+    by_team -- team whose pieces may be attacking `square`
+
+    RETURN
+    * Boolean deciding if any piece of `by_team` attacks `square`
+
+    NOTE
+    * rather than generating every move of `by_team`, this looks outward from
+    `square` along knight, pawn, king and sliding rays and stops at the first
+    attacker found.
+    '''
+    row, col = square
+    knight = by_team*N
+    for _, __, index in knight_targets[row][col]:
+        if board[index] == knight:
+            return True
 
-    for flag,_,__,x,y in threats:
-        if on_board(board, x, y) == team*K:
+    # A pawn of `by_team` attacks `square` from exactly the squares which a
+    # pawn of the other team standing on `square` would attack.
+    pawn, fresh_pawn = by_team*P, by_team*fP
+    for _, __, index in pawn_attack_targets[-by_team][row][col]:
+        if board[index] == pawn or board[index] == fresh_pawn:
             return True
+
+    king = by_team*K
+    for _, __, index in king_targets[row][col]:
+        if board[index] == king:
+            return True
+
+    queen = by_team*Q
+    ray_table = rays[row][col]
+    for directions, slider in ((diags, by_team*B), (lrup, by_team*R)):
+        for direction in directions:
+            for _, __, index in ray_table[direction]:
+                piece = board[index]
+                if piece != empty:
+                    if piece == slider or piece == queen:
+                        return True
+                    break
     return False
 
 def possible_moves(board, team, pieceloc = None): 
@@ -384,60 +453,185 @@ def possible_moves(board, team, pieceloc = None):
         moves are computed
 
     RETURN
-    moves -- a set of 5-tuples of the form (piece-identifier-at-end-of-move, 
-        end-row, end-col) denoting the spaces `pieceloc` piece/team can reach
+    moves -- a list of 5-tuples of the form (piece-identifier-at-end-of-move, 
+        start-row, start-col, end-row, end-col) denoting the spaces `pieceloc`
+        piece/team can reach
 
     NOTE 
     * this function does not remove moves which reveal checks illegally,
     or moves that fail to respond to an active check threat.
+    * castling and en'passant are left out; `legal_moves` includes them.
     '''
     if pieceloc:
         piece_locs = {pieceloc}
     else:
         piece_locs = piece_locations_for_team(board, team)
 
-    moves = set()
+    # Each piece's moves start from a different square, so simply 
+    # concatenating them can never lose or duplicate a move.
+    moves = []
     for x,y in piece_locs:
-        if on_board(board, x, y) == team*P or on_board(board, x, y) == team*fP: 
-            moves ^= pawn_move(board, x, y, team)
-        elif on_board(board, x, y) == team*N: 
-            moves ^= knight_move(board, x, y, team)
-        elif on_board(board, x, y) == team*Q:
-            moves ^= normal_move(board, x, y, team, diags + lrup)
-        elif on_board(board, x, y) == team*B:
-            moves ^= normal_move(board, x, y, team, diags)
-        elif on_board(board, x, y) == team*R:
-            moves ^= normal_move(board, x, y, team, lrup)
-        elif on_board(board, x, y) == team*K:
-            moves ^= king_move(board, x, y, team)
+        piece = int(on_board(board, x, y)) * team
+        if piece == P or piece == fP: 
+            moves += pawn_move(board, x, y, team)
+        elif piece == N: 
+            moves += knight_move(board, x, y, team)
+        elif piece == Q:
+            moves += normal_move(board, x, y, team, diags + lrup)
+        elif piece == B:
+            moves += normal_move(board, x, y, team, diags)
+        elif piece == R:
+            moves += normal_move(board, x, y, team, lrup)
+        elif piece == K:
+            moves += king_move(board, x, y, team)
         else:
             print("found nothing:",x,y,on_board(board,x,y))
-    #moves += castling_moves(board, team)
-    #moves += enpassant_moves(board, team)
     return moves
 
 
+def legal_moves(board, team):
+    '''
+    INPUT
+    board -- array shaped (8,8) containing a board state
+    team -- specifier for team, either `Wh` or `Bl`
+
+    RETURN
+    moves -- list of 5-tuples of every legal move by `team`, including 
+        castling and en'passant (which `possible_moves` leaves out)
+
+    NOTE
+    * checks and pins are worked out once from the king's square, so moves 
+    are filtered without playing each one out and testing for check.  The 
+    only exception is en'passant, which removes two pieces from one rank.
+    '''
+    king = find_king(board, team)
+    if king is None:
+        return list(possible_moves(board, team))
+    checkers, pins = checks_and_pins(board, king, team)
+
+    # The king may not step onto an attacked square.  It is lifted off the
+    # board first so it cannot shield a square it is moving away from.
+    row, col = king
+    board[col-1, row-1] = empty
+    moves = [m for m in king_move(board, row, col, team) 
+            if not is_square_attacked(board, m[3:5], -team)]
+    board[col-1, row-1] = team*K
+
+    # In double check only the king can move.
+    if len(checkers) > 1:
+        return moves
+    blocks = checkers[0] if checkers else None
+
+    for move in possible_moves(board, team):
+        start, end = move[1:3], move[3:5]
+        if start == king:
+            continue
+        # Anything else must capture or block a single checking piece...
+        if blocks is not None and end not in blocks:
+            continue
+        # ... and a pinned piece may only move along its pin.
+        if start in pins and end not in pins[start]:
+            continue
+        moves.append(move)
+
+    for _,r1,c1,r2,c2 in enpassant_moves(board, team):
+        # Play the capture out by hand: the pawn lands behind the fresh pawn,
+        # which is removed from the square beside where it started.
+        squares = ((c1-1, r1-1), (c2-1, r2-1), (c2-1, r1-1))
+        saved = [board[s] for s in squares]
+        for s, val in zip(squares, (empty, team*P, empty)):
+            board[s] = val
+        safe = not is_square_attacked(board, king, -team)
+        for s, val in zip(squares, saved):
+            board[s] = val
+        if safe:
+            moves.append((P, r1, c1, r2, c2))
+
+    # The king may not castle out of, or through, check.
+    if not checkers:
+        for move in castling_moves(board, team):
+            br, kt = move[3], move[4]
+            passed = 6 if kt == 7 else 4
+            if not (is_square_attacked(board, (br, passed), -team) or
+                    is_square_attacked(board, (br, kt), -team)):
+                moves.append(move)
+    return moves
+
+def checks_and_pins(board, king, team):
+    '''
+    INPUT
+    board -- array shaped (8,8) containing a board state
+    king -- (row, col) of `team`'s king
+    team -- specifier for team, either `Wh` or `Bl`
+
+    RETURN
+    checkers -- list with one set per piece giving check, holding the 
+        squares on which that check can be answered (the checking piece plus 
+        any squares between it and the king)
+    pins -- dictionary mapping the (row, col) of each of `team`'s pinned 
+        pieces to the set of squares it may still move to
+    '''
+    row, col = king
+    checkers = []
+    pins = {}
+    for r, c, index in knight_targets[row][col]:
+        if board[index] == -team*N:
+            checkers.append({(r, c)})
+    for r, c, index in pawn_attack_targets[team][row][col]:
+        if board[index] == -team*P or board[index] == -team*fP:
+            checkers.append({(r, c)})
+
+    queen = -team*Q
+    ray_table = rays[row][col]
+    for directions, slider in ((diags, -team*B), (lrup, -team*R)):
+        for direction in directions:
+            path = set()
+            pinned = None
+            for r, c, index in ray_table[direction]:
+                piece = board[index]
+                path.add((r, c))
+                if piece == empty:
+                    continue
+                if piece*team > 0:
+                    # A second piece of our own on the ray means no pin.
+                    if pinned:
+                        break
+                    pinned = (r, c)
+                    continue
+                if piece == slider or piece == queen:
+                    if pinned:
+                        pins[pinned] = path
+                    else:
+                        checkers.append(path)
+                break
+    return checkers, pins
+
 def castling_moves(board, team):
     '''
-    Returns 5-tuples flagged 'castle' in the first position for each possible
-    castling move in this board state by this team. 
+    Returns a king move 5-tuple `(K, br, 5, br, 3)` or `(K, br, 5, br, 7)` for
+    each possible castling move in this board state by this team.  The king
+    moving two files is what `movePiece` uses to move the rook as well.
 
     Note: This function does not check whether the castling violates check.
+    Castling rights are not stored with the board, so they are taken to hold
+    whenever the king and rook stand on their starting squares.
     '''
     # Important squares for kingside and queenside castling respectively
     castling_files = ( {'kf':5,'rf':1,'kt':3,'rt':4}, 
                        {'kf':5,'rf':8,'kt':7,'rt':6} )
     br = backrank[team]
-    moves = [('castle', None, None, 3, br), ('castle', None, None, 7, br)] # don't use starting squares for now
-    for ind,files in enumerate(castling_files):
-        if on_board(board, br, files['kf']) == team*K and on_board(board, br, files['rf']) == team*R:
-
-            # Verify spaces between rook and king are empty.
-            for f in range(min(files['rf'],files['kf'])+1, max(files['rf'],files['kf'])):
-                if on_board(board, br, f) != empty:
-                    moves[ind] = False
-                    break
-    return [m for m in moves if m]
+    moves = []
+    if on_board(board, br, 5) != team*K:
+        return moves
+    for files in castling_files:
+        if on_board(board, br, files['rf']) != team*R:
+            continue
+
+        # Verify spaces between rook and king are empty.
+        between = range(min(files['rf'],files['kf'])+1, max(files['rf'],files['kf']))
+        if all(on_board(board, br, f) == empty for f in between):
+            moves.append((K, br, files['kf'], br, files['kt']))
+    return moves
 
 def enpassant_moves(board, team, verbose=0):
     '''
@@ -469,6 +663,65 @@ def enpassant_moves(board, team, verbose=0):
     return moves
 
 
+def encode_move(move, board):
+    '''
+    INPUT
+    move -- 5-tuple (piece-at-end, r1, c1, r2, c2) as produced by 
+        `possible_moves` or `legal_moves`
+    board -- array shaped (8,8) holding the board state before `move`
+
+    RETURN
+    * `move` packed into a 16-bit integer, with its promotion, en'passant or 
+    castling nature recorded in the flag bits so it never has to be inferred
+    from the board again
+    '''
+    piece, r1, c1, r2, c2 = move
+    code = 8*(r1-1) + c1-1 | (8*(r2-1) + c2-1) << 6
+    moving = abs(board[c1-1, r1-1])
+    if moving == P or moving == fP:
+        if r2 == 1 or r2 == 8:
+            return code | promotion_pieces.index(piece) << 12 | MOVE_PROMOTION << 14
+        if c1 != c2 and board[c2-1, r2-1] == empty:
+            return code | MOVE_ENPASSANT << 14
+    elif moving == K and abs(c2 - c1) == 2:
+        return code | MOVE_CASTLING << 14
+    return code
+
+def encode_moves(moves, board):
+    '''
+    RETURN
+    * array('H') buffer holding each of `moves` packed by `encode_move`
+    '''
+    return array('H', [encode_move(move, board) for move in moves])
+
+def decode_move(code, board):
+    '''
+    INPUT
+    code -- packed move from `encode_move`
+    board -- array shaped (8,8) holding the board state before the move
+
+    RETURN
+    * the 5-tuple form of `code`, as used by `print_move` and 
+    `translateMoveToChessNotation`
+    '''
+    r1, c1 = square_to_coord[code & 63]
+    r2, c2 = square_to_coord[code >> 6 & 63]
+    if code >> 14 == MOVE_PROMOTION:
+        piece = promotion_pieces[code >> 12 & 3]
+    else:
+        piece = abs(int(board[c1-1, r1-1]))
+        # Generators always report fresh pawns as pawns
+        if piece == fP:
+            piece = P
+    return piece, r1, c1, r2, c2
+
+def legal_move_codes(board, team):
+    '''
+    RETURN
+    * array('H') buffer of every legal move by `team`, packed by `encode_move`
+    '''
+    return encode_moves(legal_moves(board, team), board)
+
 def move_to_string(piece,_,row, col,justloc=0):
     if justloc:
         out = ""
@@ -498,9 +751,10 @@ def on_board(board, row, col):
     return None
 
 def piece_locations_for_team(board,team):
-    piece_locs = zip(*np.where(board*team > 0))
-    piece_locs = ((y+1,x+1) for x,y in piece_locs)
-    return piece_locs
+    # Converting to python ints up front keeps numpy scalars out of the move
+    # tuples built from these locations, which are much slower to compare.
+    cols, rows = np.nonzero(board*team > 0)
+    return zip((rows+1).tolist(), (cols+1).tolist())
 
 def moves_on_board(move_tuple):
     '''
@@ -526,35 +780,30 @@ def pawn_move(board, row, col, team):
         piece_at_end can be different in the case of promotion.
     '''
 
-    moves = set()
+    moves = []
+    promoting = row == backrank[-team] - team
     if on_board(board, row+team, col) == empty:
-        moves = {(P, row, col, row+team, col)}
+        # Handle promotions
+        if promoting:
+            for p_code in promotion_pieces:
+                moves.append((p_code, row, col, row+team, col))
+        else:
+            moves.append((P, row, col, row+team, col))
         
         # Handle double-move if have not moved previously.
         if on_board(board, row+2*team,col) == empty and row == backrank[team] + team:
-            moves.add((P, row, col, row+2*team, col))
+            moves.append((P, row, col, row+2*team, col))
     
     # Attacks
-    candidates = {(row+team,col+1), (row+team,col-1)}
-    for cand in candidates:
-        pieceval = on_board(board, cand[0], cand[1])
-        if pieceval and pieceval * team < 0:
+    for x, y, index in pawn_attack_targets[team][row][col]:
+        if board[index] * team < 0:
             # attacking promotion
-            if row == backrank[-team] - team:
-                for p_code in pieceStrToVal.values():
-                    if p_code != K:
-                        moves.add((p_code, row, col, cand[0], cand[1]))
+            if promoting:
+                for p_code in promotion_pieces:
+                    moves.append((p_code, row, col, x, y))
             else:
-                moves.add((P, row, col, cand[0], cand[1]))
-            
-
-    # Handle promotions
-    if row == backrank[-team] - team:
-        if on_board(board, backrank[-team], col) == empty:
-            for p_code in pieceStrToVal.values():
-                if p_code != K:
-                    moves.add((p_code, row, col, row+team, col))
-    return moves_on_board(moves)
+                moves.append((P, row, col, x, y))
+    return moves
 
 def knight_move(board, row, col, team):
     '''
@@ -568,14 +817,11 @@ def knight_move(board, row, col, team):
     moves -- in the form (N, end_row, end_col) of possible ending squares
     '''
 
-    moves = set()
-    for x in [-2,-1,1,2]:
-        for y in [-2,-1,1,2]:
-            if abs(x) == abs(y): continue
-            pieceval = on_board(board, row+x, col+y)
-            if pieceval != None and pieceval*team <= 0:
-                moves.add((N,row,col,row+x,col+y))
-    return moves_on_board(moves)
+    moves = []
+    for x, y, index in knight_targets[row][col]:
+        if board[index]*team <= 0:
+            moves.append((N,row,col,x,y))
+    return moves
 
 def king_move(board, row, col, team):
     '''
@@ -592,14 +838,11 @@ def king_move(board, row, col, team):
     * this does not include castling nor does it check for check violations.
     '''
 
-    moves = set()
-    for x in [-1,0,1]:
-        for y in [-1,0,1]:
-            if x==0 and y==0: continue
-            pieceval = on_board(board, row+x, col+y)
-            if pieceval != None and pieceval*team <= 0:
-                moves.add((K,row,col,row+x,col+y))
-    return moves_on_board(moves)
+    moves = []
+    for x, y, index in king_targets[row][col]:
+        if board[index]*team <= 0:
+            moves.append((K,row,col,x,y))
+    return moves
 
 def generate_straight(board, start_row, start_col, direction):
     '''
@@ -612,11 +855,8 @@ def generate_straight(board, start_row, start_col, direction):
     YIELD
     * 3-tuple of the piece, row, and col of next space in sequence
     '''
-    for mult in range(1,8):
-        new_x = start_row + direction[0]*mult
-        new_y = start_col + direction[1]*mult
-        if 1 <= new_x <= 8 and 1 <= new_y <= 8:
-            yield on_board(board, new_x, new_y), start_row, start_col, new_x, new_y
+    for new_x, new_y, index in rays[start_row][start_col][tuple(direction)]:
+        yield board[index], start_row, start_col, new_x, new_y
 
 def normal_move(board, row, col, team, sign_pairs):
     '''
@@ -634,19 +874,20 @@ def normal_move(board, row, col, team, sign_pairs):
     straight moves, diagonal moves, or both.
     
     RETURN
-    moves -- set of three tuples of the form [piece, landing_x, landing_y]
+    moves -- list of 5-tuples of the form (piece, row, col, landing_x, landing_y)
     '''
-    moves = set()
-    this_piece = abs(on_board(board, row, col))
+    moves = []
+    this_piece = abs(board[col-1, row-1])
+    ray_table = rays[row][col]
     for direction in sign_pairs:
-        for piece,x1,y1,x2,y2 in generate_straight(board, row, col, direction):
-            # Note that `generate_straight` already checks for boundary violations
-            assert(x1==row)
-            assert(y1==col)
+        # The precomputed rays stop at the edge of the board, so there are no
+        # boundary checks to make here.
+        for x, y, index in ray_table[tuple(direction)]:
+            piece = board[index]
             if piece == empty:
-                moves.add((this_piece, row, col, x2, y2))
+                moves.append((this_piece, row, col, x, y))
             else:
                 if piece*team < 0:
-                    moves.add((this_piece, row, col, x2, y2))
+                    moves.append((this_piece, row, col, x, y))
                 break
     return moves
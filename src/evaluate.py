@@ -0,0 +1,126 @@
+'''
+Static evaluation of board states by piece-square table.
+
+`play.score_board` scores a board by walking every square.  Each of its terms
+depends on a single square, so its whole score can be written as a sum over
+squares of a table `piece_square[piece+8][sq]`:
+
+* material, from `pieceValue`, worth 10% more on the central 4x4 squares.
+* the 1000 point penalty for a missing king becomes a 1000 point bonus for
+  each king on the board, as both kings' bonuses cancel when present.
+* likewise the 0.1 penalty for a king off its starting square becomes a 0.1
+  bonus for a king standing on it.
+
+Scores are in pawns from white's point of view.  Because a move only changes
+a few squares, the sum can be kept up to date with `evaluation_delta` rather
+than recomputed.
+
+The same table is also held as a (17,8,8) array laid out like the board, so
+`evaluate_array` can score one board or a whole stack of them with a single
+NumPy reduction.
+'''
+import numpy as np
+from chess import *
+from game import make_move
+
+pieceValue = {P : 1,
+       fP : 1,
+       B : 3,
+       N : 3,
+       R : 5,
+       Q : 9,
+       empty : 0,
+       K : 600}
+
+CENTER_FACTOR = 1.1
+MISSING_KING = 1000
+KING_HOME = .1
+
+def _square_value(piece, row, col):
+    sign = 1 if piece > 0 else -1
+    # Codes which never stand on a board (castling) are worth nothing
+    value = pieceValue.get(abs(piece), 0)
+    if 2 < row < 7 and 2 < col < 7:
+        value *= CENTER_FACTOR
+    if abs(piece) == K:
+        value += MISSING_KING
+        if row == backrank[sign] and col == 5:
+            value += KING_HOME
+    return sign*value
+
+# piece_square[piece+8][sq] for every piece code on [-8,8], with
+# sq = 8*(row-1) + (col-1).  Empty squares score 0.
+piece_square = [[_square_value(piece, sq//8 + 1, sq%8 + 1) if piece else 0
+        for sq in range(64)] for piece in range(-8, 9)]
+
+# PIECE_SQUARE[piece+8, col-1, row-1] == piece_square[piece+8][sq], so
+# indexing it with a board gives the value of each of its squares.
+PIECE_SQUARE = np.array([[[piece_square[p][8*r + c] for r in range(8)] for c in range(8)]
+        for p in range(17)])
+_cols, _rows = np.indices((8,8))
+
+def evaluate(board):
+    '''
+    INPUT
+    board -- array shaped (8,8) containing a board state
+
+    RETURN
+    score -- the same score as `play.score_board`, computed from the table
+    '''
+    score = 0
+    for sq, piece in squares(board):
+        if piece:
+            score += piece_square[piece+8][sq]
+    return score
+
+def evaluation_delta(board, undo):
+    '''
+    INPUT
+    board -- board state after a move
+    undo -- the (array index, previous value) records of the move, as
+        returned by `make_move`
+
+    RETURN
+    delta -- change in `evaluate(board)` made by the move
+    '''
+    delta = 0
+    seen = []
+    for index, old in undo:
+        # As in `zobrist.update_key`, a square written twice is only
+        # counted from its original contents.
+        if index in seen:
+            continue
+        seen.append(index)
+        sq = 8*index[1] + index[0]
+        delta += piece_square[board[index]+8][sq] - piece_square[old+8][sq]
+    return delta
+
+def evaluate_array(boards):
+    '''
+    INPUT
+    boards -- array shaped (8,8) holding a board state, or (N,8,8) holding N
+        of them
+
+    RETURN
+    score -- `evaluate` of the board as a float, or an array of N scores
+    '''
+    boards = np.asarray(boards)
+    scores = PIECE_SQUARE[boards + 8, _cols, _rows].sum(axis=(-2,-1))
+    if boards.ndim == 2:
+        return float(scores)
+    return scores
+
+def evaluate_moves(board, moves, team):
+    '''
+    INPUT
+    board -- array shaped (8,8) containing a board state, left unchanged
+    moves -- packed moves for `team`, as from `legal_move_codes`
+
+    RETURN
+    scores -- array of the `evaluate` score after each of `moves`, computed
+        in one call on a stack of the child boards
+    '''
+    children = np.repeat(board[np.newaxis], len(moves), axis=0)
+    for child, move in zip(children, moves):
+        make_move(child, move, team)
+    return evaluate_array(children)
@@ -1,5 +1,6 @@
 import numpy as np
 from chess import *
+from zobrist import update_key
 
 # a:1, ..., h:8
 rankLetterToCol = {chr(i):i-96 for i in range(97,105)}
@@ -30,7 +31,8 @@ class BaseGame:
         self.verbose = verbosity
 
 class Game(BaseGame):
-    def __init__(self, cpTeam, movemaker, verbosity = 0, savestates = True, load_file = None, save_file = 'saved.txt'):
+    def __init__(self, cpTeam, movemaker, verbosity = 0, savestates = True, load_file = None, save_file = 'saved.txt',
+            ponderer = None):
         '''
         INPUT
         result -- a string '1' or '0' or '1/2' indicating the game result
@@ -40,6 +42,10 @@ class Game(BaseGame):
         RETURN
         self -- Game instance
 
+        If given, `ponderer.ponder(board, team)` is called before waiting on
+        the user's move and `ponderer.stopPondering()` once it is read, so
+        the computer can think on the user's time (see `play.Engine`).
+
         Also builds the board to the initial setup ready for simulation.
         self.board[i,j] is the ith rank (row) and jth file (column), each
         indexed from 0-7
@@ -48,6 +54,7 @@ class Game(BaseGame):
         self.result = ''
         self._cpTeam = cpTeam
         self._movemaker = movemaker
+        self._ponderer = ponderer
         
 
     def getNextMove(self,team):
@@ -59,11 +66,17 @@ class Game(BaseGame):
         return move
 
     def getNextUserMove(self, team):
-        move = input("move:")
-        candidate = self.parseMove(move, team)
-        while candidate[0][0][0] == None or candidate[0][0][1] == None or candidate[0][1][0] == None or candidate[0][1][0] == None:
-            move = input("Didn't understand, try again.\n\nmove:")
-            candidate = self.parseMove(move,team)
+        if self._ponderer:
+            self._ponderer.ponder(self.board, team)
+        try:
+            move = input("move:")
+            candidate = self.parseMove(move, team)
+            while candidate[0][0][0] == None or candidate[0][0][1] == None or candidate[0][1][0] == None or candidate[0][1][0] == None:
+                move = input("Didn't understand, try again.\n\nmove:")
+                candidate = self.parseMove(move,team)
+        finally:
+            if self._ponderer:
+                self._ponderer.stopPondering()
         return candidate
 
     def getNextComputerMove(self, team):
@@ -442,45 +455,112 @@ class Game(BaseGame):
         return print_board(self.board, self.turn)
 
 # Helper functions
-def movePiece(board, start, end, team, enpassant = False, promotion = None):
+def movePiece(board, start, end, team, enpassant = False, promotion = None, undo = None, key = None):
     '''
     Given a start and end coordinates (2-lists) and a team 
     distinction, the board gets updated accordingly.
+
+    If `undo` is a list, an (array index, previous value) pair is appended to
+    it for every square this move changes, which is enough for
+    `unmake_move` to restore the board.
+
+    If `key` is the Zobrist hash of the board before the move (see
+    `zobrist.py`), the hash after the move is returned, updated from only the
+    squares which changed.
     '''
-    
+    if key is not None and undo is None:
+        undo = []
+
     # Regardless of any other movements, all fresh pawns are converted to regular pawns.
-    for x,y in zip(*np.where(board*team > 0)):
-        if board[x,y] == team*fP:
-            board[x,y] = team*P
+    reset_fresh_pawns(board, team, undo)
     
+    piece = int(on_board_wraparound(board, *start))
+
     #Special case of a promotion 
-    if end[0] == 8 and on_board_wraparound(board, *start) == P or end[0] == 1 and on_board_wraparound(board, *start) == -P:
-        setCoord(board, *end, team*promotion)
+    if end[0] == 8 and piece == P or end[0] == 1 and piece == -P:
+        setCoord(board, *end, team*promotion, undo)
     else:
         # In the case of double-moving pawn (special case to allow en'passant on it)
-        if on_board_wraparound(board, *start) == team*P and abs(end[0] - start[0]) == 2:
-            setCoord(board, *end, team*fP)
+        if piece == team*P and abs(end[0] - start[0]) == 2:
+            setCoord(board, *end, team*fP, undo)
 
         # All other basic moves
         else:
             #Replace destination with moving piece
-            setCoord(board, *end, on_board_wraparound(board, *start))
+            setCoord(board, *end, piece, undo)
     
     # Remove the pawn that has been en'passanted
     if enpassant:
-        setCoord(board, end[0] - team, end[1], empty)
+        setCoord(board, end[0] - team, end[1], empty, undo)
     
     #Replace starting place with empty
-    setCoord(board, *start, empty)
+    setCoord(board, *start, empty, undo)
 
     #Handles the rook move in the case of castling
-    if on_board_wraparound(board,*end) == team*K and abs(end[1] - start[1]) > 1:
+    if piece == team*K and abs(end[1] - start[1]) > 1:
         if end[1] == 7:
-            setCoord(board, team, 6, team*R)
-            setCoord(board, team, 8, empty)
+            setCoord(board, team, 6, team*R, undo)
+            setCoord(board, team, 8, empty, undo)
         elif end[1] == 3:            
-            setCoord(board, team, 4, team*R)
-            setCoord(board, team, 1, empty)
+            setCoord(board, team, 4, team*R, undo)
+            setCoord(board, team, 1, empty, undo)
+
+    if key is not None:
+        return update_key(key, board, undo)
+
+def reset_fresh_pawns(board, team, undo = None):
+    '''
+    Converts `team`'s fresh pawns back to regular pawns, as happens at the
+    start of each of its moves.
+    '''
+    # A fresh pawn can only stand on the rank it double-moved to, so only
+    # that rank needs to be searched.
+    fresh_rank = backrank[team] + 3*team
+    for x, piece in enumerate(board[:, fresh_rank-1].tolist()):
+        if piece == team*fP:
+            setCoord(board, fresh_rank, x+1, team*P, undo)
+
+def make_null_move(board, team):
+    '''
+    Passes `team`'s turn without moving, for null-move pruning.  Its fresh
+    pawns still revert to regular pawns, as the opponent's chance to take
+    them en'passant has passed.
+
+    RETURN
+    undo -- as returned by `make_move`
+    '''
+    undo = []
+    reset_fresh_pawns(board, team, undo)
+    return undo
+
+def make_move(board, move, team):
+    '''
+    INPUT
+    board -- array shaped (8,8) containing a board state, updated in place
+    move -- packed 16-bit move from `encode_move` (see `chess.py`)
+    team -- team making the move
+
+    RETURN
+    undo -- list of (array index, previous value) pairs for only the squares
+        this move changed, including fresh pawns reverting and the rook move
+        when castling.  Pass it to `unmake_move` to take the move back, or to
+        `zobrist.update_key` to update the board's hash.
+    '''
+    start = square_to_coord[move & 63]
+    end = square_to_coord[move >> 6 & 63]
+    flag = move >> 14
+    promotion = promotion_pieces[move >> 12 & 3] if flag == MOVE_PROMOTION else None
+    undo = []
+    movePiece(board, start, end, team, enpassant=flag == MOVE_ENPASSANT, promotion=promotion, undo=undo)
+    return undo
+
+def unmake_move(board, undo):
+    '''
+    Restores `board` to its state before the `make_move` call which
+    returned `undo`.
+    '''
+    for index, value in reversed(undo):
+        board[index] = value
 
 def on_board_wraparound(board, c1, c2):
     '''
@@ -537,7 +617,7 @@ def translateMoveToChessNotation(move):
     col = colToRankLetter[move[4]]
     return piece + str(col) + str(row)
 
-def setCoord(board, row, col, val):
+def setCoord(board, row, col, val, undo = None):
     '''
     INPUT is in (row,col) format
     Maps two coordinates on the union of [-8,-1] U [1,8] to the piece at
@@ -548,9 +628,14 @@ def setCoord(board, row, col, val):
     
     row==0 and col==0 are due to checkStraights() or checkDiags() testing a 
     position which is out of bounds, so None is returned.
+
+    If `undo` is a list, the (array index, previous value) pair is appended
+    to it before writing.
     '''
     if row < 0: row += 9
     if col < 0: col += 9
+    if undo is not None:
+        undo.append(((col-1, row-1), board[col-1, row-1]))
     board[col-1, row-1] = val
     return board
 
@@ -601,9 +686,44 @@ def string_to_board(board_str):
         setCoord(board, row, col, team*piece)
     return board, turn
 
-def play_game(cp_team, cp_movemaker, load_file = None, save_file = None):
+def fen_to_board(fen):
+    '''
+    INPUT
+    fen -- string in Forsyth-Edwards Notation
+
+    RETURN
+    board, turn -- as returned by `string_to_board`
+
+    NOTE
+    * castling availability is not read, since castling is allowed whenever
+    the king and rook stand on their starting squares.
+    * an en'passant target square marks the pawn which just double-moved as
+    a fresh pawn.
+    '''
+    fields = fen.split()
+    board = np.zeros((8,8), dtype=np.int8)
+    for i, rank in enumerate(fields[0].split('/')):
+        row = 8 - i
+        col = 1
+        for x in rank:
+            if x.isdigit():
+                col += int(x)
+                continue
+            team = Wh if x.isupper() else Bl
+            setCoord(board, row, col, team*pieceStrToVal[x.upper()])
+            col += 1
+    turn = Bl if len(fields) > 1 and fields[1] == 'b' else Wh
+    if len(fields) > 3 and fields[3] != '-':
+        # The pawn stands just past the target square, from the point of view
+        # of the team to play.
+        row = int(fields[3][1]) - turn
+        col = rankLetterToCol[fields[3][0]]
+        setCoord(board, row, col, -turn*fP)
+    return board, turn
+
+def play_game(cp_team, cp_movemaker, load_file = None, save_file = None, ponderer = None):
     # Create new human-vs-computer game with the computer as `team`, using `alphabeta_adj_move` to make its moves
     #game = Game(team, random_move)
-    game = Game(cp_team, cp_movemaker, verbosity=1, load_file = load_file, save_file = save_file)
+    game = Game(cp_team, cp_movemaker, verbosity=1, load_file = load_file, save_file = save_file, ponderer = ponderer)
     game.runGame()
 
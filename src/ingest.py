@@ -0,0 +1,132 @@
+'''
+Checking PGN files over a pool of worker processes.
+
+`run_history` hands a list of PGN files to `ingest`, which splits them into
+shards of at most `SHARD_BYTES` each, and small enough that every worker has
+several of them to check even when the input is a single file:
+
+* a file smaller than that is one shard, read by the worker from the start.
+* the games wanted from a larger file are picked out by its index (see
+  `pgn_index.py`) and cut into runs, and the worker seeks straight to each
+  of its games.
+
+Each worker replays and validates the games of its shard and sends back only
+its tallies, which are added up as the shards finish.
+'''
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from read_pgn import read_indexed_game, stream_games, correct_games, check_moves
+from pgn_index import load_index
+
+SHARD_BYTES = 4 * 2**20
+
+def shard_size(files, workers):
+    '''
+    RETURN
+    * size in bytes of the shards to cut `files` into, so that each of
+      `workers` processes gets about four of them, up to `SHARD_BYTES`
+    '''
+    if workers <= 1:
+        return SHARD_BYTES
+    total_bytes = sum(os.path.getsize(fname) for fname in files)
+    return max(1, min(SHARD_BYTES, total_bytes // (4*workers)))
+
+def shard_files(files, start_count = 0, max_count = 0, shard_bytes = None, select = None, workers = 1):
+    '''
+    INPUT
+    files -- list of PGN file names
+    start_count, max_count -- first game of each file to check, and how many
+        of them (0 for all)
+    shard_bytes -- files larger than this are split into shards about this
+        size, by default `shard_size(files, workers)`
+    select -- as for `read_pgn.read_games`.  The games of large files are
+        selected here, from the headers in their index.
+    workers -- number of processes the shards will be shared between
+
+    RETURN
+    shards -- list of (fname, first, count, games) for each shard: `count`
+        games of `fname` (0 for the rest of the file) from game number
+        `first`.  For a large file, `games` lists the (number, offset,
+        length) of each game in the shard, otherwise it is None.
+    '''
+    if shard_bytes is None:
+        shard_bytes = shard_size(files, workers)
+    shards = []
+    for fname in files:
+        if os.path.getsize(fname) <= shard_bytes:
+            shards.append((fname, start_count, max_count, None))
+            continue
+        index = load_index(fname)
+        games = [(number, *index[number]) for number in index.numbers(start_count, select)]
+        if max_count:
+            games = games[:max_count]
+        while games:
+            size = count = 0
+            for _, _, length in games:
+                if count and size + length > shard_bytes:
+                    break
+                size += length
+                count += 1
+            shards.append((fname, games[0][0], count, games[:count]))
+            games = games[count:]
+    return shards
+
+def _read_shard(raw, games, verbosity):
+    '''
+    YIELD
+    game -- each of `games` from the open file `raw` which replays
+        correctly, as for `read_pgn.correct_games`
+    '''
+    for number, offset, length in games:
+        yield from correct_games(read_indexed_game(raw, offset, length, verbosity), verbosity, number)
+
+def _check_shard(fname, first, count, games, verbosity, select):
+    '''
+    Replays and validates the games of one shard from `shard_files`.
+
+    RETURN
+    fname, correct, total -- as for `read_pgn.check_moves`
+    '''
+    if games is None:
+        # The whole file is read anyway, so there is no need for its index
+        records = stream_games(fname, first, count, verbosity, use_index=False, select=select)
+        correct, total = check_moves(correct_games(records, verbosity, first), verbosity)
+        return fname, correct, total
+    with open(fname, 'rb') as raw:
+        correct, total = check_moves(_read_shard(raw, games, verbosity), verbosity)
+    return fname, correct, total
+
+def ingest(files, workers, start_count = 0, max_count = 0, verbosity = 0, shard_bytes = None, select = None):
+    '''
+    INPUT
+    files -- list of PGN file names
+    workers -- number of worker processes, or 1 to check every shard in
+        this process
+    select -- as for `read_pgn.read_games`.  It is sent to the workers, so
+        must be picklable, as a `read_pgn.GameFilter` is.
+
+    Other arguments are as for `shard_files`.
+
+    RETURN
+    correct, total -- number of moves found valid, and of moves checked,
+        over all the files
+    '''
+    shards = shard_files(files, start_count, max_count, shard_bytes, select, workers)
+    if workers > 1:
+        pool = ProcessPoolExecutor(workers)
+        results = (future.result() for future in
+                as_completed([pool.submit(_check_shard, *shard, verbosity, select) for shard in shards]))
+    else:
+        pool = None
+        results = (_check_shard(*shard, verbosity, select) for shard in shards)
+    correct = total = 0
+    try:
+        for fname, shard_correct, shard_total in results:
+            correct += shard_correct
+            total += shard_total
+            if verbosity:
+                print("{0}: {1} / {2}".format(fname, shard_correct, shard_total))
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
+    return correct, total
@@ -2,48 +2,142 @@ from read_pgn import *
 from chess import *
 from play import *
 from test import run_tests
+from perft import run_perft, run_divide
+from bench import run_bench
+from parallel import ParallelEngine
+from archive import run_archive
 from itertools import chain
 from sys import argv
 
 '''
 COMMAND-LINE options:
-py main.py play [White/Black] [game_file]
-py main.py play Black
+py main.py play [White/Black] [game_file] [--movetime=seconds] [--nodes=N] [--depth=N] [--hash=MB] [--seed=N] [--workers=N]
+    [--pvs=0/1] [--aspiration=pawns] [--stats=json_file] [--ponder]
+py main.py play Black --movetime=2
 py main.py test
-py main.py hist [verbosity]
+py main.py hist [verbosity] [PGN file, directory or glob] [--start=N] [--count=N] [--workers=N]
+    [--player=name] [--eco=prefix] [--years=first-last] [--result=1-0] [--elo=low-high]
+py main.py hist [verbosity] [archive.arc] [--start=N] [--count=N] [filters as above]
+py main.py archive [PGN file, directory or glob] [archive file] [filters as above]
+py main.py perft [depth] [position name or FEN]
+py main.py divide [depth] [position name or FEN]
+py main.py bench [depth] [verbosity]
 '''
 
 DEFAULT_SAVE_FILE = 'saved.txt'
 
+class ArgumentError(Exception):
+    pass
+
+# `--name=value` options of `play`, with the type of their value.  They
+# configure the engine's search limits and transposition table size.
+play_flags = {'movetime': float, 'nodes': int, 'depth': int, 'hash': float, 'seed': int,
+        'workers': int, 'pvs': int, 'aspiration': float,
+        'stats': str, 'ponder': int}
+
+def int_range(value):
+    '''
+    Reads `low-high`, or a single number standing for both, as (low, high).
+    '''
+    low, _, high = value.partition('-')
+    return int(low), int(high or low)
+
+# Options of `hist`: the first game of each file to check, how many (0 for
+# all), and the number of processes to share the files out over
+hist_flags = {'start': int, 'count': int, 'workers': int}
+# Options of `hist` picking the games to check by their headers, passed on
+# to `GameFilter`
+filter_flags = {'player': str, 'eco': str, 'years': int_range, 'result': str, 'elo': int_range}
+
 
 
 mode_to_function = {
         'play': play_game,
         'hist': run_history,
-        'test': run_tests}
+        'test': run_tests,
+        'perft': run_perft,
+        'divide': run_divide,
+        'bench': run_bench,
+        'archive': run_archive}
+
+
+def parse_flags(argv, flag_types):
+    '''
+    Splits `--name=value` flags out of `argv`.
 
+    RETURN
+    positional -- the remaining arguments, in order
+    flags -- dictionary of each flag's value, converted by `flag_types`
+    '''
+    positional = []
+    flags = {}
+    for arg in argv:
+        if not arg.startswith('--'):
+            positional.append(arg)
+            continue
+        name, _, value = arg[2:].partition('=')
+        if name not in flag_types:
+            raise ArgumentError("unknown option --{0}".format(name))
+        # A bare `--name` switches an option on
+        flags[name] = flag_types[name](value) if value else flag_types[name](1)
+    return positional, flags
 
 def parse_input(argv):
-    mode_options = ('play','hist','test')
+    mode_options = ('play','hist','test','perft','divide','bench','archive')
     mode = argv[1].lower()
     other_options = []
     if mode == 'play':
+        argv, flags = parse_flags(argv, play_flags)
         try:
             team = argv[2][0].lower()
             cp_team = Wh if team == 'b' else Bl
-            cp_movemaker = alphabeta_adj_move
+            engine_options = (flags.get('hash', DEFAULT_MEGABYTES), flags.get('movetime'),
+                    flags.get('nodes'), flags.get('depth'), flags.get('seed'))
+            search_options = {'pvs': bool(flags.get('pvs', True)), 'aspiration': flags.get('aspiration'),
+                    'stats_file': flags.get('stats')}
+            ponderer = None
+            if flags.get('workers', 1) > 1:
+                if flags.get('ponder'):
+                    raise ArgumentError("--ponder cannot be combined with --workers")
+                cp_movemaker = ParallelEngine(flags['workers'], *engine_options, **search_options).move
+            elif flags:
+                engine = Engine(*engine_options, **search_options)
+                cp_movemaker = engine.move
+                if flags.get('ponder'):
+                    ponderer = engine
+            else:
+                cp_movemaker = alphabeta_adj_move
             load_file = argv[4] if len(argv) > 4 else None
             save_file = argv[3] if len(argv) > 3 else load_file # Will simply append to the existing file
         except IndexError:
             raise ArgumentError("expected call of form `$python main.py play [team] [load_file] [save_file]")
-        other_options = [cp_team, cp_movemaker, load_file, save_file]
+        other_options = [cp_team, cp_movemaker, load_file, save_file, ponderer]
     elif mode == "test":
         verbosity = int(argv[2]) if len(argv) > 2 else 0
         other_options = (verbosity,)
     elif mode == "hist":
-        fname = "../data/Adams.pgn"
+        argv, flags = parse_flags(argv, dict(hist_flags, **filter_flags))
         verbosity = int(argv[2]) if len(argv) > 2 else 0
-        other_options = (fname, verbosity)
+        path = argv[3] if len(argv) > 3 else "../data/Adams.pgn"
+        criteria = {name: value for name, value in flags.items() if name in filter_flags}
+        select = GameFilter(**criteria) if criteria else None
+        other_options = (path, verbosity, flags.get('start', 0), flags.get('count', 1), flags.get('workers', 1), select)
+    elif mode == "archive":
+        argv, flags = parse_flags(argv, filter_flags)
+        path = argv[2] if len(argv) > 2 else "../data/Adams.pgn"
+        archive_name = argv[3] if len(argv) > 3 else None
+        other_options = (path, archive_name, 0, GameFilter(**flags) if flags else None)
+    elif mode == "bench":
+        depth = int(argv[2]) if len(argv) > 2 else None
+        verbosity = int(argv[3]) if len(argv) > 3 else 0
+        other_options = (depth, verbosity)
+    elif mode in ("perft", "divide"):
+        depth = int(argv[2]) if len(argv) > 2 else None
+        position = " ".join(argv[3:]) if len(argv) > 3 else None
+        if mode == "divide":
+            other_options = (depth or 1, position or 'start')
+        else:
+            other_options = (depth, position)
     return mode, other_options
     
 def execute_command(mode, other_options):
@@ -0,0 +1,226 @@
+'''
+Root-parallel search over a pool of worker processes.
+
+`ParallelEngine` searches the first (best ordered) root move on its own, then
+hands the remaining root moves to a `ProcessPoolExecutor`, one task each.
+Every worker keeps its own `Engine`, and so its own transposition table, for
+as long as the pool lives.  The best score found so far at the root is shared
+between the workers through a `multiprocessing.Value`, and a task which sees
+it rise searches again within the tighter window rather than finishing with
+a looser one.
+
+The budget is shared the same way: the workers add their nodes to one shared
+counter as they go, and one shared event stops every running task at once,
+whether the node budget ran out in a worker or the parent's time did.
+'''
+import time
+import inspect
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from play import *
+
+# `Engine` options which change how the workers search, passed on to them
+WORKER_OPTIONS = ('seed', 'check_eval', 'pvs', 'null_move', 'lmr', 'lmr_moves')
+
+# Seconds the parent waits on its tasks between checks of its clock
+POLL_SECONDS = 0.01
+
+# State of each worker process, set up once by `_init_worker`
+_worker_engine = None
+_worker_generation = None
+_shared_alpha = None
+_shared_nodes = None
+_stop_event = None
+
+class _AlphaRaised(Exception):
+    pass
+
+class _WorkerEngine(Engine):
+    '''
+    `Engine` run by a worker process, which checks the budget and bound
+    shared with the other processes rather than its own.
+    '''
+    def _checkBudget(self):
+        '''
+        Every 256 nodes, adds this task's nodes to the shared counter, and
+        raises `SearchStopped` if the search has been stopped or the shared
+        node budget is spent, or `_AlphaRaised` if another task has raised
+        the shared alpha above the one this task is searching with.
+        '''
+        if self.nodes & 255 == 0:
+            self._shareNodes()
+            if _stop_event.is_set() or _shared_nodes.value >= self._stop_nodes:
+                raise SearchStopped()
+            if _shared_alpha.value > self._task_alpha:
+                raise _AlphaRaised()
+
+    def _shareNodes(self):
+        with _shared_nodes.get_lock():
+            _shared_nodes.value += self.nodes - self._shared
+        self._shared = self.nodes
+
+def _init_worker(shared_alpha, shared_nodes, stop_event, tt_megabytes, options):
+    global _worker_engine, _shared_alpha, _shared_nodes, _stop_event
+    _shared_alpha = shared_alpha
+    _shared_nodes = shared_nodes
+    _stop_event = stop_event
+    _worker_engine = _WorkerEngine(tt_megabytes, **options)
+
+def _search_move(board, team, move, depth, beta, generation, node_limit):
+    '''
+    Searches the root move `move` of `board` to `depth` in a worker process,
+    within the shared alpha and `beta`.
+
+    INPUT
+    generation -- counter of the parent's searches, so the worker only ages
+        its tables once per parent search rather than once per task
+    node_limit -- node budget of the whole search, against the shared count
+
+    RETURN
+    move, score, exact, nodes, stats -- `score` is None if the task ran out
+        of budget, and `exact` is False if it failed low against the shared
+        alpha, in which case `score` is only an upper bound.  A score at or
+        above `beta` is only a lower bound.  `stats` is the `SearchStats` of
+        this task alone.
+    '''
+    global _worker_generation
+    engine = _worker_engine
+    if generation != _worker_generation:
+        engine.newSearch()
+        _worker_generation = generation
+    engine.nodes = 0
+    engine._shared = 0
+    engine.stats = SearchStats()
+    engine._stop_nodes = node_limit
+    make_move(board, move, team)
+    key = hash_board(board, -team)
+    try:
+        while True:
+            # A stopped search leaves its board half played, so each attempt
+            # starts from a copy
+            child = board.copy()
+            engine.score = evaluate(child)
+            alpha = engine._task_alpha = _shared_alpha.value
+            if _stop_event.is_set():
+                raise SearchStopped()
+            try:
+                _, score = engine._alphabeta(child, depth-1, -beta, -alpha, -team, key, 1)
+                break
+            except _AlphaRaised:
+                # The transposition table keeps what the last attempt found
+                pass
+    except SearchStopped:
+        return move, None, False, engine.nodes, engine.stats
+    finally:
+        engine._shareNodes()
+        engine._stop_nodes = float('inf')
+    score = -score
+    exact = score > alpha
+    if exact:
+        with _shared_alpha.get_lock():
+            if score > _shared_alpha.value:
+                _shared_alpha.value = score
+    return move, score, exact, engine.nodes, engine.stats
+
+class ParallelEngine(Engine):
+    def __init__(self, workers, tt_megabytes = DEFAULT_MEGABYTES, *args, **kwargs):
+        '''
+        INPUT
+        workers -- number of worker processes
+        tt_megabytes -- memory cap of each process's transposition table
+
+        Other arguments are as for `Engine`, and those in `WORKER_OPTIONS`
+        are given to the workers' engines too.
+        '''
+        Engine.__init__(self, tt_megabytes, *args, **kwargs)
+        arguments = inspect.signature(Engine.__init__).bind(self, tt_megabytes, *args, **kwargs).arguments
+        options = {name: arguments[name] for name in WORKER_OPTIONS if name in arguments}
+        self.workers = workers
+        self.generation = 0
+        self.alpha = multiprocessing.Value('d', -INF)
+        self.shared_nodes = multiprocessing.Value('q', 0)
+        self.stop_event = multiprocessing.Event()
+        self.pool = ProcessPoolExecutor(workers, initializer=_init_worker,
+                initargs=(self.alpha, self.shared_nodes, self.stop_event, tt_megabytes, options))
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+    def newSearch(self):
+        Engine.newSearch(self)
+        self.generation += 1
+
+    def _searchRoot(self, board, depth, team, key, alpha, beta):
+        '''
+        Same contract as `Engine._searchRoot`, with the root moves shared
+        out between the worker processes.
+        '''
+        moves = real_possible_moves(board, team, depth)
+        # Shallow searches cost less than sending them to the pool
+        if depth <= 1 or len(moves) <= 1:
+            return Engine._searchRoot(self, board, depth, team, key, alpha, beta)
+        entry = self.tt.probe(key)
+        first = self._pv_moves.get(key) or (entry[3] if entry else None)
+        moves = self.orderMoves(board, moves, first, 0, team)
+
+        self.alpha.value = alpha
+        # The first move is searched alone, so the rest start from its bound
+        results = self._runTasks(board, depth, team, moves[:1], beta)
+        if results[moves[0]][0] < beta:
+            results.update(self._runTasks(board, depth, team, moves[1:], beta))
+
+        best_move, value = None, -INF
+        for move in moves:
+            score, exact = results.get(move, (-INF, False))
+            if exact and score > value:
+                best_move, value = move, score
+        if best_move is None:
+            # Every move failed low, so the position is worth at most the
+            # best of their upper bounds
+            best_move = moves[0]
+            value = max(score for score, exact in results.values())
+        if value <= alpha:
+            flag = UPPER
+        elif value >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.tt.store(key, depth, flag, score_to_tt(value, 0), best_move)
+        return best_move, value
+
+    def _runTasks(self, board, depth, team, moves, beta):
+        '''
+        RETURN
+        results -- dictionary mapping each of `moves` to its (score, exact)
+
+        Raises `SearchStopped` if the budget runs out before every task
+        finishes, once every task already running has stopped.  The node
+        budget is checked by each worker every 256 nodes, so it may be
+        overrun by up to that many nodes per worker.
+        '''
+        self.shared_nodes.value = self.nodes
+        self.stop_event.clear()
+        pending = {self.pool.submit(_search_move, board, team, move, depth, beta,
+                self.generation, self._stop_nodes)
+                for move in moves}
+        results = {}
+        while pending:
+            done, pending = wait(pending, POLL_SECONDS, FIRST_COMPLETED)
+            for future in done:
+                if future.cancelled():
+                    continue
+                move, score, exact, task_nodes, task_stats = future.result()
+                self.nodes += task_nodes
+                self.stats.add(task_stats)
+                if score is None:
+                    self.stop_event.set()
+                else:
+                    results[move] = score, exact
+            if self._stop or time.perf_counter() >= self._deadline:
+                self.stop_event.set()
+            if self.stop_event.is_set():
+                for future in pending:
+                    future.cancel()
+        if self.stop_event.is_set():
+            raise SearchStopped()
+        return results
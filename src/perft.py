@@ -0,0 +1,123 @@
+'''
+Perft (performance test) counts of the move generator.
+
+`perft` counts the leaf nodes of the full legal game tree to a fixed depth.
+Comparing these counts to the published figures for a handful of standard
+positions checks the move generator's correctness, and timing them gives the
+benchmark that move generation optimizations are tracked against.
+'''
+import time
+from game import *
+
+# (name, FEN, known node counts at depth 1, 2, ...)
+POSITIONS = [
+        ('start', 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq -',
+            [20, 400, 8902, 197281]),
+        ('kiwipete', 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq -',
+            [48, 2039, 97862]),
+        ('position3', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - -',
+            [14, 191, 2812, 43238]),
+        ('position4', 'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+            [6, 264, 9467]),
+        ('position5', 'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+            [44, 1486, 62379]),
+        ('position6', 'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+            [46, 2079, 89890]),
+        ]
+
+# Deepest level run for each position by default, to keep a full run short.
+DEFAULT_DEPTH = 3
+
+def perft(board, team, depth):
+    '''
+    INPUT
+    board -- array shaped (8,8) containing a board state.  Moves are made and
+        unmade on it in place, so it is unchanged on return.
+    team -- team to play
+    depth -- number of plies to search
+
+    RETURN
+    nodes -- number of leaf nodes of the legal move tree at `depth`
+    '''
+    moves = legal_move_codes(board, team)
+    if depth <= 1:
+        return len(moves) if depth == 1 else 1
+    nodes = 0
+    for move in moves:
+        undo = make_move(board, move, team)
+        nodes += perft(board, -team, depth-1)
+        unmake_move(board, undo)
+    return nodes
+
+def divide(board, team, depth):
+    '''
+    RETURN
+    counts -- dictionary mapping each legal move (as a 5-tuple) to the perft
+        count of the position it leads to at `depth`-1, which is the usual
+        way to track down which move a wrong count comes from
+    '''
+    counts = {}
+    for move in legal_move_codes(board, team):
+        tup = decode_move(move, board)
+        undo = make_move(board, move, team)
+        counts[tup] = perft(board, -team, depth-1)
+        unmake_move(board, undo)
+    return counts
+
+def find_position(position):
+    '''
+    Looks `position` up by name in `POSITIONS`, or treats it as a FEN string.
+
+    RETURN
+    name, fen, expected -- `expected` is empty for an unknown FEN
+    '''
+    for name, fen, expected in POSITIONS:
+        if position == name:
+            return name, fen, expected
+    return position, position, []
+
+def run_perft(depth = None, position = None, verbose = 0):
+    '''
+    INPUT
+    depth -- deepest level to count (default `DEFAULT_DEPTH`, capped at the
+        known counts for each standard position)
+    position -- name of one of `POSITIONS` or a FEN string.  All standard
+        positions are run if `None`.
+    verbose -- print a line per depth, not just per position
+
+    RETURN
+    * Boolean, True if every count matched its known value
+    '''
+    positions = [find_position(position)] if position else POSITIONS
+    all_correct = True
+    total_nodes = 0
+    total_time = 0
+    for name, fen, expected in positions:
+        board, team = fen_to_board(fen)
+        max_depth = depth if depth else DEFAULT_DEPTH
+        if expected and not position:
+            max_depth = min(max_depth, len(expected))
+        for d in range(1, max_depth+1):
+            start = time.perf_counter()
+            nodes = perft(board, team, d)
+            elapsed = time.perf_counter() - start
+            total_nodes += nodes
+            total_time += elapsed
+            correct = d > len(expected) or nodes == expected[d-1]
+            all_correct = all_correct and correct
+            if verbose or not correct or d == max_depth:
+                status = "" if correct else "  MISMATCH (expected {0})".format(expected[d-1])
+                print("{0:>10} depth {1}: {2:>9} nodes {3:8.2f}s {4:>9.0f} nps{5}".format(
+                    name, d, nodes, elapsed, nodes / max(elapsed, 1e-9), status))
+    print("{0} nodes in {1:.2f}s ({2:.0f} nps){3}".format(total_nodes, total_time,
+        total_nodes / max(total_time, 1e-9), "" if all_correct else ", COUNTS DO NOT MATCH"))
+    return all_correct
+
+def run_divide(depth, position = 'start'):
+    name, fen, expected = find_position(position)
+    board, team = fen_to_board(fen)
+    counts = divide(board, team, depth)
+    for move in sorted(counts):
+        print(print_move(move), counts[move])
+    print("{0} moves, {1} nodes".format(len(counts), sum(counts.values())))
+    return counts
@@ -0,0 +1,200 @@
+'''
+Sidecar index of the games in a PGN file, for random access.
+
+Reaching game N of a PGN file otherwise means reading every game before it.
+`build_index` makes one pass over the file recording where each game starts,
+how many bytes it takes and its header tags, and `load_index` keeps this in
+`<file>.idx` next to the PGN file.  The index stores the size and
+modification time of the file it was built from, and is rebuilt whenever
+either no longer matches.
+
+Offsets and lengths are kept in `array('Q')`s, eight bytes a game, and the
+header tags apart from them, so finding a game never builds a dictionary per
+game; the headers are only read from the file when a caller asks for them,
+to select games by them.  All numbers are little-endian, and the file is
+laid out as:
+
+* a header: `MAGIC`, the format version (uint32), the size and modification
+  time of the PGN file (int64 each) and the number of games (uint64).
+* the offset of each game, then the length of each game (uint64 each).
+* the header tags of every game, as a UTF-8 JSON list of dictionaries.
+
+A game is split out of the file by the same rules `read_pgn.read_games` uses,
+so reading from a game's offset with `read_games` gives that game first.
+'''
+import os
+import re
+import sys
+import json
+import struct
+from array import array
+
+INDEX_SUFFIX = '.idx'
+INDEX_VERSION = 2
+MAGIC = b'PGNINDEX'
+
+_header = re.compile(rb'\[(\w+)\s+"(.*)"\]')
+_file_header = struct.Struct('<8sIqqQ')
+
+def little_endian(values):
+    '''
+    Puts the array `values` into little-endian byte order in place, for
+    reading from or writing to a file.
+    '''
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+def index_path(fname):
+    return fname + INDEX_SUFFIX
+
+def _file_stamp(fname):
+    stat = os.stat(fname)
+    return stat.st_size, stat.st_mtime_ns
+
+class GameIndex:
+    def __init__(self, offsets, lengths, headers = None, fname = None, headers_at = None):
+        '''
+        INPUT
+        offsets, lengths -- array('Q') of the byte offset and length of each
+            game in the PGN file, in order
+        headers -- list of a dictionary of each game's tag pairs, or None to
+            read them from byte `headers_at` of the index file `fname` when
+            they are first asked for
+        '''
+        self.offsets = offsets
+        self.lengths = lengths
+        self._headers = headers
+        self._fname = fname
+        self._headers_at = headers_at
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, i):
+        '''
+        RETURN
+        offset, length -- of game `i`, in bytes
+        '''
+        return self.offsets[i], self.lengths[i]
+
+    def __eq__(self, other):
+        return (self.offsets, self.lengths, self.headers()) == (other.offsets, other.lengths, other.headers())
+
+    def headers(self):
+        '''
+        RETURN
+        * list of a dictionary of each game's tag pairs
+        '''
+        if self._headers is None:
+            with open(self._fname, 'rb') as f:
+                f.seek(self._headers_at)
+                self._headers = json.loads(f.read())
+        return self._headers
+
+    def numbers(self, start_count = 0, select = None):
+        '''
+        INPUT
+        start_count -- first game to consider
+        select -- as for `read_pgn.read_games`, matched against the headers
+
+        RETURN
+        * iterable of the number of each game picked, in order
+        '''
+        if select is None:
+            return range(start_count, len(self))
+        headers = self.headers()
+        return (number for number in range(start_count, len(self)) if select(headers[number]))
+
+def build_index(fname):
+    '''
+    INPUT
+    fname -- string name of PGN file
+
+    RETURN
+    index -- `GameIndex` of the games in the file
+    '''
+    offsets = array('Q')
+    lengths = array('Q')
+    games = []
+    inMoves = False
+    start = None
+    headers = {}
+    offset = 0
+    with open(fname, 'rb') as pgn:
+        for line in pgn:
+            if not inMoves:
+                match = _header.match(line)
+                if match:
+                    if start is None:
+                        start = offset
+                    headers[match.group(1).decode()] = match.group(2).decode(errors='replace')
+                elif line[:1] == b'1':
+                    inMoves = True
+                    if start is None:
+                        start = offset
+            elif line in (b'\n', b'\r\n'):
+                offsets.append(start)
+                lengths.append(offset - start)
+                games.append(headers)
+                inMoves = False
+                start = None
+                headers = {}
+            offset += len(line)
+    # The last game need not be followed by a blank line
+    if inMoves:
+        offsets.append(start)
+        lengths.append(offset - start)
+        games.append(headers)
+    return GameIndex(offsets, lengths, games)
+
+def _read_index(fname, size, mtime):
+    '''
+    RETURN
+    index -- `GameIndex` read from the index file `fname`, without its
+        headers, or None if it is not an index of this version for a PGN
+        file of `size` and `mtime`
+    '''
+    with open(fname, 'rb') as f:
+        magic, version, saved_size, saved_mtime, count = _file_header.unpack(f.read(_file_header.size))
+        if (magic, version, saved_size, saved_mtime) != (MAGIC, INDEX_VERSION, size, mtime):
+            return None
+        offsets = array('Q', f.read(8*count))
+        lengths = array('Q', f.read(8*count))
+    if len(lengths) != count:
+        return None
+    return GameIndex(little_endian(offsets), little_endian(lengths), None, fname, _file_header.size + 16*count)
+
+def _write_index(fname, index, size, mtime):
+    with open(fname, 'wb') as f:
+        f.write(_file_header.pack(MAGIC, INDEX_VERSION, size, mtime, len(index)))
+        for values in (index.offsets, index.lengths):
+            f.write(little_endian(array('Q', values)).tobytes())
+        f.write(json.dumps(index.headers()).encode())
+
+def load_index(fname, save = True):
+    '''
+    INPUT
+    fname -- string name of PGN file
+    save -- boolean to write a rebuilt index to the sidecar file
+
+    RETURN
+    index -- as for `build_index`, read from the sidecar file if it is up to
+        date with `fname`, otherwise built afresh.  The headers of a saved
+        index are only read when `GameIndex.headers` is called.
+    '''
+    size, mtime = _file_stamp(fname)
+    try:
+        index = _read_index(index_path(fname), size, mtime)
+        if index is not None:
+            return index
+    except (OSError, struct.error):
+        pass
+    index = build_index(fname)
+    if save:
+        try:
+            _write_index(index_path(fname), index, size, mtime)
+        except OSError:
+            # The index only saves time, so a read-only directory is no reason to fail
+            pass
+    return index
@@ -1,89 +1,643 @@
 from chess import *
 from game import *
+from zobrist import hash_board
+from transposition import *
+from evaluate import *
+from stats import SearchStats, CUTOFF_SLOTS
+import numpy as np
 import random
+import threading
+import time
 
 eps = .001
 MAXDEPTH = 4
-def alphabeta(board,maxdepth,team):
-    return _alphabeta(board,maxdepth,-1000,1000,team,team)
-
-def _alphabeta(board,depth,alpha,beta,cpTeam,team,verbose=0):
-    indent = "    "*(MAXDEPTH - depth)
-    if depth == 0:
-        score = cpTeam*score_board(board)
-        if verbose>0:print(indent,"scoring: ",team, score)
-        return None, score
-    moves = list(real_possible_moves(board,team,depth))
-    random.shuffle(moves)
-    if team == cpTeam:
-        value = -1000
+
+# Scores are in pawns from the point of view of the team to play.  Being
+# checkmated scores -(MATE - ply), so faster mates score higher and every
+# mate score lies beyond MATE - MAXPLY.
+INF = 1000
+MATE = 900
+MAXPLY = 100
+
+# Captures in the quiescence search which leave the score this far below
+# alpha, even after winning the piece, are not searched.
+DELTA_MARGIN = 2
+
+# Width of the null windows used by PVS.
+NULL_WINDOW = eps
+
+# Null-move pruning and late-move reductions only apply this far from the
+# leaves, where the plies they save are worth the risk.
+REDUCTION_MIN_DEPTH = 3
+NULL_MOVE_REDUCTION = 2
+LMR_REDUCTION = 1
+LMR_MIN_MOVES = 3
+
+class SearchStopped(Exception):
+    '''
+    Raised inside the search once its time or node budget runs out.
+    '''
+
+class Engine:
+    def __init__(self, tt_megabytes = DEFAULT_MEGABYTES, movetime = None, nodes = None, depth = None, seed = None,
+            check_eval = False, pvs = True, aspiration = None, null_move = NULL_MOVE_REDUCTION,
+            lmr = LMR_REDUCTION, lmr_moves = LMR_MIN_MOVES, stats_file = None):
+        '''
+        Search state which persists between the moves of a game, so the work
+        done searching one move is reused on the next.
+
+        INPUT
+        tt_megabytes -- memory cap of the transposition table
+        movetime -- seconds allowed to choose each move in `move`
+        nodes -- nodes allowed to choose each move in `move`
+        depth -- deepest iteration searched in `move`.  If no limit is given
+            at all, the depth is picked from the position as
+            `alphabeta_adj_move` always has.
+        seed -- if given, moves the ordering cannot tell apart are shuffled
+            by a random generator seeded with it, so play varies between
+            seeds but is repeatable.  Otherwise ties keep generation order.
+        check_eval -- debug mode, recomputing `score_board` at every leaf to
+            check the incrementally kept score against it
+        pvs -- principal variation search: moves after the first at each
+            node are only searched with a null window, proving they are no
+            better, and re-searched in full if that proof fails
+        aspiration -- half-width in pawns of the window each iteration after
+            the first starts from around the last score, widening on a
+            fail-high or fail-low.  0 or None searches every iteration with a
+            full window, which is the default since `score_board` often
+            swings by several pawns between odd and even depths.
+        null_move -- depth reduction of null-move pruning, which passes the
+            turn and prunes the node if the opponent still cannot bring the
+            score below beta.  It is skipped when in check, and when the
+            team to play has only pawns left, where passing could well be
+            its best option (zugzwang).  0 turns it off.
+        lmr -- depth reduction of late-move reductions, applied to quiet
+            moves after the first `lmr_moves` at a node (when not in check).
+            A reduced move which still beats alpha is searched again at full
+            depth.  0 turns it off.
+        stats_file -- if given, the `SearchStats` of each search made by
+            `move` are appended to this file as a line of JSON
+        '''
+        self.tt = TranspositionTable(tt_megabytes)
+        self.movetime = movetime
+        self.max_nodes = nodes
+        self.max_depth = depth
+        self.nodes = 0
+        self.stats = SearchStats()
+        self.stats_file = stats_file
+        self.pv = []
+        self._pv_moves = {}
+        self._stop_nodes = float('inf')
+        self._deadline = float('inf')
+        # Set from another thread to stop the search at its next check
+        self._stop = False
+        self._pondering = None
+        self._ponder_key = None
+        self._ponder_result = None
+        self.ponder_hits = 0
+        self.rng = random.Random(seed) if seed is not None else None
+        # Static score of the board being searched, from white's point of
+        # view, updated by each move's delta as it is made and unmade.
+        self.score = 0
+        self.check_eval = check_eval
+        self.pvs = pvs
+        self.aspiration = aspiration
+        self.null_move = null_move
+        self.lmr = lmr
+        self.lmr_moves = lmr_moves
+        # killers[ply] holds the last two quiet moves which caused a cutoff
+        # at that ply, and history[team][move & 4095] how much cutoffs by
+        # each quiet (start, end) pair have been worth.
+        self.killers = [[0, 0] for _ in range(MAXPLY+1)]
+        self.history = {Wh: [0]*4096, Bl: [0]*4096}
+
+    def newSearch(self):
+        '''
+        Resets the state kept between the iterations of one search.
+        Killers only relate to the position they were found in, while the
+        history table is aged so old results give way to new ones.
+        '''
+        self.tt.newSearch()
+        self.nodes = 0
+        self.stats = SearchStats()
+        self.killers = [[0, 0] for _ in range(MAXPLY+1)]
+        for table in self.history.values():
+            table[:] = [h >> 1 for h in table]
+
+    def orderMoves(self, board, moves, first, ply, team):
+        '''
+        RETURN
+        moves -- list of `moves` in the order to search them: `first` (the
+            principal variation or transposition table move), then captures
+            and promotions by MVV-LVA (most valuable victim, then least
+            valuable attacker), then the killer moves of this ply, then the
+            remaining quiet moves by their history score
+        '''
+        if self.rng:
+            moves = list(moves)
+            self.rng.shuffle(moves)
+        killers = self.killers[ply]
+        history = self.history[team]
+        def priority(move):
+            if move == first:
+                return 4000000
+            gain = capture_gain(board, move)
+            if gain:
+                start = move & 63
+                return 3000000 + 1000*gain - pieceValue[abs(board[start & 7, start >> 3])]
+            if move == killers[0]:
+                return 2000001
+            if move == killers[1]:
+                return 2000000
+            return min(history[move & 4095], 1999999)
+        return sorted(moves, key=priority, reverse=True)
+
+    def _checkBudget(self):
+        '''
+        Raises `SearchStopped` once the node budget is spent, or, checking
+        only every 256 nodes as reading the clock costs more, once the time
+        is up or `stopPondering` has asked the search to stop.
+        '''
+        if self.nodes >= self._stop_nodes or (self.nodes & 255 == 0 and (self._stop or time.perf_counter() >= self._deadline)):
+            raise SearchStopped()
+
+    def staticScore(self, board):
+        '''
+        RETURN
+        score -- `score_board(board)`, read from the running total rather
+            than recomputed
+        '''
+        if self.check_eval:
+            full = score_board(board)
+            if abs(full - self.score) > eps:
+                raise Exception("incremental score {0} does not match score_board {1}".format(self.score, full))
+        return self.score
+
+    def search(self, board, depth, team):
+        '''
+        RETURN
+        move -- best move found for `team`, packed as by `encode_move`
+        score -- its negamax score from `team`'s perspective
+        '''
+        self.newSearch()
+        # The search makes and unmakes moves in place, so work on a private
+        # copy to keep the caller's board safe from an interrupted search.
+        board = board.copy()
+        self.score = evaluate(board)
+        try:
+            return self._searchRoot(board, depth, team, hash_board(board, team), -INF, INF)
+        finally:
+            self.stats.finish(self.nodes)
+
+    def think(self, board, team, max_depth = MAXPLY, movetime = None, nodes = None, verbose = 0):
+        '''
+        Iterative deepening: searches depth 1, 2, ... until `max_depth` is done
+        or the time (seconds) or node budget runs out, ordering each
+        iteration by the principal variation of the one before.
+
+        RETURN
+        move, score -- as for `search`, from the last iteration to finish.
+            Depth 1 is always finished, so there is a move whenever one is
+            legal.
+        '''
+        self.newSearch()
+        self.pv = []
+        self._pv_moves = {}
+        start = time.perf_counter()
+        board = board.copy()
+        self.score = evaluate(board)
+        key = hash_board(board, team)
+        root_moves = len(legal_move_codes(board, team))
+        best = None, 0
+        for depth in range(1, max_depth+1):
+            try:
+                best = self._aspirationSearch(board, depth, team, key, best[1] if depth > 1 else None)
+            except SearchStopped:
+                break
+            finally:
+                self._stop_nodes = float('inf')
+                self._deadline = float('inf')
+            self.stats.finishIteration(depth, self.nodes)
+            self.pv = self.principalVariation(board, team, key, depth)
+            self._pv_moves = {k: m for k, m in self.pv}
+            elapsed = time.perf_counter() - start
+            if verbose>0:
+                print("depth {0}: {1} ({2:.2f}) {3} nodes {4:.2f}s pv {5}".format(depth,
+                    show_move(best[0],board), best[1], self.nodes, elapsed, self.showPV(board, team)))
+            # A forced mate will not be improved on, and a lone legal move
+            # needs no further thought
+            if abs(best[1]) > MATE - MAXPLY or root_moves <= 1:
+                break
+            # The next iteration costs several times this one, so it would
+            # only be cut off
+            if movetime is not None and elapsed > movetime / 2:
+                break
+            if nodes is not None and self.nodes >= nodes:
+                break
+            # Only later iterations may be stopped partway
+            if movetime is not None:
+                self._deadline = start + movetime
+            if nodes is not None:
+                self._stop_nodes = nodes
+        self.stats.finish(self.nodes)
+        return best
+
+    def _aspirationSearch(self, board, depth, team, key, guess):
+        '''
+        Searches the root within a window around `guess`, the score of the
+        previous iteration, which cuts off more of the tree than a full
+        window.  A score outside the window is only a bound, so the search
+        is repeated with the window widened on that side until it is not.
+        '''
+        if guess is None or not self.aspiration or abs(guess) > MATE - MAXPLY:
+            return self._searchRoot(board, depth, team, key, -INF, INF)
+        window = self.aspiration
+        alpha, beta = guess - window, guess + window
+        while True:
+            move, score = self._searchRoot(board, depth, team, key, alpha, beta)
+            if alpha < score < beta:
+                return move, score
+            window *= 4
+            if score <= alpha:
+                alpha = max(guess - window, -INF)
+            else:
+                beta = min(guess + window, INF)
+
+    def _searchRoot(self, board, depth, team, key, alpha, beta):
+        '''
+        Searches the root position to `depth` within (alpha, beta).  Kept
+        separate so other engines can split the root differently.
+        '''
+        return self._alphabeta(board, depth, alpha, beta, team, key, 0)
+
+    def principalVariation(self, board, team, key, depth):
+        '''
+        RETURN
+        pv -- list of (hash, move) pairs following the best moves stored in
+            the transposition table from the root, at most `depth` long
+        '''
+        pv = []
+        undos = []
+        seen = set()
+        while len(pv) < depth and key not in seen:
+            seen.add(key)
+            entry = self.tt.probe(key)
+            if not entry or not entry[3] or entry[3] not in legal_move_codes(board, team):
+                break
+            pv.append((key, entry[3]))
+            undo = make_move(board, entry[3], team)
+            undos.append(undo)
+            key = update_key(key, board, undo)
+            team = -team
+        for undo in reversed(undos):
+            unmake_move(board, undo)
+        return pv
+
+    def showPV(self, board, team):
+        board = board.copy()
+        moves = []
+        for key, move in self.pv:
+            moves.append(show_move(move, board))
+            make_move(board, move, team)
+            team = -team
+        return ", ".join(moves)
+
+    def ponder(self, board, team):
+        '''
+        Starts searching in a background thread while the opponent, `team`,
+        thinks over `board`.  If the last search predicted the opponent's
+        reply, the position after it is searched, so that if the prediction
+        comes true `move` can answer at once.  Otherwise the opponent's own
+        position is searched, which still leaves the transposition table
+        holding results for the positions after its likely replies.
+
+        The search runs until `stopPondering` is called.
+        '''
+        self.stopPondering()
+        key = hash_board(board, team)
+        predicted = self._pv_moves.get(key)
+        if not predicted:
+            entry = self.tt.probe(key)
+            predicted = entry[3] if entry else None
+        board = board.copy()
+        if predicted and predicted in legal_move_codes(board, team):
+            make_move(board, predicted, team)
+            team = -team
+        self._ponder_key = hash_board(board, team)
+        self._ponder_result = None
+        self._pondering = threading.Thread(target=self._ponderSearch, args=(board, team), daemon=True)
+        self._pondering.start()
+
+    def _ponderSearch(self, board, team):
+        start = time.perf_counter()
+        move, score = self.think(board, team)
+        depth = self.stats.iterations[-1][0] if self.stats.iterations else 0
+        self._ponder_result = move, score, depth, self.nodes, time.perf_counter() - start
+
+    def stopPondering(self):
+        '''
+        Stops the background search started by `ponder`, waiting for it to
+        finish so the engine is free to search again.
+        '''
+        if self._pondering:
+            self._stop = True
+            self._pondering.join()
+            self._pondering = None
+            self._stop = False
+
+    def _ponderHit(self, board, team, depth):
+        '''
+        RETURN
+        move, score -- the result of pondering, if it searched `board` and
+            went at least as far as this engine's limits would, else None
+        '''
+        if not self._ponder_result or hash_board(board, team) != self._ponder_key:
+            return None
+        move, score, ponder_depth, ponder_nodes, ponder_time = self._ponder_result
+        if move is None:
+            return None
+        if self.movetime is not None:
+            done = ponder_time >= self.movetime
+        elif self.max_nodes is not None:
+            done = ponder_nodes >= self.max_nodes
+        else:
+            done = ponder_depth >= depth
+        # Finished iterations would come straight from the transposition
+        # table anyway, but answering here skips even that
+        if done or abs(score) > MATE - MAXPLY:
+            self.ponder_hits += 1
+            return move, score
+        return None
+
+    def move(self, board, team, movenum, return_stats = False):
+        '''
+        Movemaker for `Game`, searching within this engine's limits.  With
+        `return_stats` the search's `SearchStats` are returned after the move.
+        '''
+        self.stopPondering()
+        depth = self.max_depth
+        if depth is None:
+            if self.movetime is None and self.max_nodes is None:
+                depth = adjusted_depth(board, team, movenum)
+            else:
+                depth = MAXPLY
+        result = self._ponderHit(board, team, depth)
+        self._ponder_result = None
+        if result:
+            move,score = result
+        else:
+            move,score = self.think(board, team, depth, self.movetime, self.max_nodes)
+        if self.stats_file:
+            self.stats.dump(self.stats_file, move=show_move(move,board), score=score, movenum=movenum)
+        if return_stats:
+            return move_response(move,board), self.stats
+        return move_response(move,board)
+
+    def _alphabeta(self, board, depth, alpha, beta, team, key, ply, verbose = 0, allow_null = True):
+        '''
+        Negamax alpha-beta search of `board` with `team` to play, whose
+        Zobrist hash is `key`, `ply` moves below the root.  `allow_null` is
+        False straight after a null move, so the turn is never passed twice
+        in a row.
+        '''
+        self.nodes += 1
+        self._checkBudget()
+        indent = "    "*ply
+        if depth == 0:
+            score = self._quiesce(board, alpha, beta, team, ply)
+            if verbose>0:print(indent,"scoring: ",team, score)
+            return None, score
+
+        alpha_orig = alpha
+        tt_move = None
+        stats = self.stats
+        stats.tt_probes += 1
+        entry = self.tt.probe(key)
+        if entry:
+            stats.tt_hits += 1
+            tt_depth, flag, score, tt_move = entry
+            # The root always searches, so that it has a move to return
+            if tt_depth >= depth and ply > 0:
+                score = score_from_tt(score, ply)
+                if flag == EXACT:
+                    stats.tt_cutoffs += 1
+                    return tt_move, score
+                if flag == LOWER:
+                    alpha = max(alpha, score)
+                else:
+                    beta = min(beta, score)
+                if alpha >= beta:
+                    stats.tt_cutoffs += 1
+                    return tt_move, score
+
+        in_check = is_in_check(board,team) if depth >= REDUCTION_MIN_DEPTH else None
+        if (allow_null and self.null_move and ply > 0 and not in_check and depth >= REDUCTION_MIN_DEPTH
+                and team*self.score >= beta and beta < MATE - MAXPLY and has_pieces(board,team)):
+            undo = make_null_move(board,team)
+            delta = evaluation_delta(board,undo)
+            self.score += delta
+            _,score = self._alphabeta(board, max(0, depth-1-self.null_move), -beta, -beta+NULL_WINDOW, -team,
+                    update_key(key,board,undo), ply+1, verbose, False)
+            score = -score
+            unmake_move(board,undo)
+            self.score -= delta
+            if score >= beta:
+                stats.null_cutoffs += 1
+                # A mate found after passing is not a proven mate
+                return None, beta if score > MATE - MAXPLY else score
+
+        moves = real_possible_moves(board,team,depth)
+        if not moves:
+            if is_in_check(board,team):
+                return None, -(MATE - ply)
+            # Stalemate
+            return None, 0
+        # The previous iteration's principal variation is searched first,
+        # then the best move of any earlier search of this position.
+        first = self._pv_moves.get(key) or tt_move
+        moves = self.orderMoves(board, moves, first, ply, team)
+
+        value = -INF
         best_move = None
-        for move in moves:
-            child_board = hypothetical_board(board,move)
-            if verbose>0:print(indent,"move: ", print_move(move))
-            _,newval = _alphabeta(child_board,depth-1,alpha, beta, cpTeam,-team)
+        for i, move in enumerate(moves):
+            if verbose>0:print(indent,"move: ", show_move(move,board))
+            reduce = (self.lmr and i >= self.lmr_moves and depth >= REDUCTION_MIN_DEPTH
+                    and not in_check and not capture_gain(board,move))
+            undo = make_move(board,move,team)
+            delta = evaluation_delta(board,undo)
+            self.score += delta
+            child_key = update_key(key,board,undo)
+            if reduce:
+                _,newval = self._alphabeta(board, max(0, depth-1-self.lmr), -alpha-NULL_WINDOW, -alpha, -team, child_key, ply+1, verbose)
+                newval = -newval
+                if newval > alpha:
+                    stats.lmr_researches += 1
+            if reduce and newval <= alpha:
+                # The reduced search shows the move is no better
+                pass
+            elif i == 0 or not self.pvs:
+                _,newval = self._alphabeta(board, depth-1, -beta, -alpha, -team, child_key, ply+1, verbose)
+                newval = -newval
+            else:
+                _,newval = self._alphabeta(board, depth-1, -alpha-NULL_WINDOW, -alpha, -team, child_key, ply+1, verbose)
+                newval = -newval
+                if alpha < newval < beta:
+                    _,newval = self._alphabeta(board, depth-1, -beta, -alpha, -team, child_key, ply+1, verbose)
+                    newval = -newval
+            unmake_move(board,undo)
+            self.score -= delta
             if newval > value:
-                if value > -1000:
-                    if verbose>0:print(indent,"(",alpha,"): choosing ",print_move(move)," (",newval,") over ",print_move(best_move)," (",value,")")
+                if value > -INF:
+                    if verbose>0:print(indent,"(",alpha,"): choosing ",show_move(move,board)," (",newval,") over ",show_move(best_move,board)," (",value,")")
                 best_move = move
                 value = newval
             alpha = max(alpha, value)
-            if alpha > beta:
-                #print("alpha={0} > beta={1}",alpha,beta)
+            if alpha >= beta:
+                stats.cutoffs[min(i, CUTOFF_SLOTS-1)] += 1
+                if not capture_gain(board, move):
+                    killers = self.killers[ply]
+                    if move != killers[0]:
+                        killers[1] = killers[0]
+                        killers[0] = move
+                    self.history[team][move & 4095] += depth*depth
                 break
+
+        if value <= alpha_orig:
+            flag = UPPER
+        elif value >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.tt.store(key, depth, flag, score_to_tt(value, ply), best_move)
         return best_move,value
-    value = 1000
-    best_move = None
-    for move in moves:
-        child_board = hypothetical_board(board,move)
-        
-        # best move for opponent (lowest score)
-        if verbose>0:print(indent,"response: ",print_move(move))
-        _,newval = _alphabeta(child_board, depth-1, alpha, beta, cpTeam,-team)
-        if newval < value:
-            if value < 1000:
-                if verbose>0:print(indent,"(",beta,"): ",print_move(move)," (",newval,") is a stronger response than ",print_move(best_move)," (",value,")")
-            best_move = move
-            value = newval
-
-        beta = min(beta, value)
-        if beta <= alpha:
-            #print("alpha={0} >= beta={1}",alpha,beta)
-            break
-    if team != cpTeam:
-        if verbose>0:print(indent,"White would play ",print_move(best_move)," since it attains his best score ",value)
-    return best_move,value
-        
+
+    def _quiesce(self, board, alpha, beta, team, ply):
+        '''
+        Searches only captures and promotions below the leaves of the main
+        search, so positions are not scored halfway through an exchange.
+
+        The team to play may always "stand pat" on the static score instead,
+        which bounds the score from below, and captures which could not
+        raise the score to `alpha` even with `DELTA_MARGIN` to spare are
+        skipped.
+        '''
+        self.stats.leaves += 1
+        stand_pat = team*self.staticScore(board)
+        if stand_pat >= beta or ply >= MAXPLY:
+            return stand_pat
+        moves = real_possible_moves(board,team,0)
+        if not moves:
+            if is_in_check(board,team):
+                return -(MATE - ply)
+            return 0
+        alpha = max(alpha, stand_pat)
+        captures = []
+        for move in moves:
+            gain = capture_gain(board, move)
+            if gain and stand_pat + gain + DELTA_MARGIN > alpha:
+                captures.append(move)
+        for move in self.orderMoves(board, captures, None, ply, team):
+            self.nodes += 1
+            self._checkBudget()
+            undo = make_move(board,move,team)
+            delta = evaluation_delta(board,undo)
+            self.score += delta
+            score = -self._quiesce(board, -beta, -alpha, -team, ply+1)
+            unmake_move(board,undo)
+            self.score -= delta
+            if score >= beta:
+                return score
+            alpha = max(alpha, score)
+        return alpha
+
+def has_pieces(board, team):
+    '''
+    RETURN
+    * Boolean, True if `team` has any piece besides its king and pawns
+    '''
+    own = board*team
+    return bool(np.any((own >= R) & (own <= Q)))
+
+def capture_gain(board, move):
+    '''
+    RETURN
+    gain -- material won by `move` going by `pieceValue`: the captured piece,
+        plus the promotion for a pawn reaching the back rank.  Quiet moves
+        gain 0.
+    '''
+    end = move >> 6 & 63
+    victim = board[end & 7, end >> 3]
+    flag = move >> 14
+    gain = pieceValue[abs(victim)]
+    if flag == MOVE_ENPASSANT:
+        gain = pieceValue[P]
+    elif flag == MOVE_PROMOTION:
+        gain += pieceValue[promotion_pieces[move >> 12 & 3]] - pieceValue[P]
+    return gain
+
+def score_to_tt(score, ply):
+    '''
+    Mate scores count plies from the root, but a table entry may be reached
+    at any ply, so they are stored counting from the entry's own position.
+    '''
+    if score > MATE - MAXPLY:
+        return score + ply
+    if score < -(MATE - MAXPLY):
+        return score - ply
+    return score
+
+def score_from_tt(score, ply):
+    if score > MATE - MAXPLY:
+        return score - ply
+    if score < -(MATE - MAXPLY):
+        return score + ply
+    return score
+
+# Shared by the module-level movemakers, so the transposition table lasts for
+# a whole game.
+engine = Engine()
+
+def alphabeta(board,maxdepth,team):
+    '''
+    RETURN
+    move -- best move found for `team`, packed as by `encode_move`
+    score -- its score from `team`'s perspective
+    '''
+    return engine.search(board,maxdepth,team)
+
 def alphabeta_move(board,team,movenum):
-    minscores = []
     move,score = alphabeta(board,MAXDEPTH,team)
-    return (move[1:3],move[3:5]),False
+    return move_response(move,board)
 
-def alphabeta_adj_move(board,team,movenum):
-    depth = 3
-    minscores = []
-    score = score_board(board)
+def alphabeta_adj_move(board,team,movenum,return_stats=False):
+    return engine.move(board,team,movenum,return_stats)
 
-    if team*score < -5:
-        depth += 1
+def adjusted_depth(board,team,movenum):
+    '''
+    Depth searched when no limits are given: shallower in the opening.
+    '''
+    depth = 3
     if movenum < 8:
         depth -= 1
-    
-    move,score = alphabeta(board,depth,team)
-    return (move[1:3],move[3:5]),False,None
-    
+    return depth
 
 def real_possible_moves(board,team,depth):
-    moves = list(possible_moves(board,team))
-    real_moves = []
-    for move in moves:
-        child_board = hypothetical_board(board,move)
-        if not is_in_check(child_board,team):
-            real_moves.append(move)
-        else:
-            if depth == MAXDEPTH:
-                print("CAN'T PLAY ",print_move(move), " SINCE IT VIOLATES CHECK")
-    return real_moves
+    return legal_move_codes(board,team)
+
+def move_response(move,board):
+    '''
+    Converts a packed move into the ((start, end), enpassant, promotion) form
+    `Game.makeMove` expects from a movemaker.
+    '''
+    piece,r1,c1,r2,c2 = decode_move(move,board)
+    flag = move >> 14
+    promotion = piece if flag == MOVE_PROMOTION else None
+    return ([r1,c1],[r2,c2]), flag == MOVE_ENPASSANT, promotion
+
+def show_move(move,board):
+    if move is None:
+        return ""
+    return print_move(decode_move(move,board))
 
 
 def score_board(board):
@@ -111,19 +665,11 @@ def score_board(board):
     return total
 
 def hypothetical_board(board,move):
-    move = (move[1:3],move[3:5],False)
     local_board = board.copy()
-    movePiece(local_board,*move)
+    team = Wh if on_board(board,*move[1:3]) > 0 else Bl
+    make_move(local_board,encode_move(move,board),team)
     return local_board
 
 def signed_value(piece):
     sign = (int(piece>0)-.5)*2
     return sign,sign * pieceValue[abs(piece)]
-pieceValue = {P : 1,
-       fP : 1,
-       B : 3,
-       N : 3,
-       R : 5,
-       Q : 9,
-       empty : 0,
-       K : 600}
@@ -1,10 +1,14 @@
 '''
-TODO: Add more data files and seamless reading of multiple files.  (Ideally all .pgn's in ../data directory).
 TODO: Handle en'passant by making pawns "fresh pawns" for exactly one move after a double move.
 '''
 
+import io
+import os
+import re
+import glob
 import numpy as np
 from game import *
+from pgn_index import load_index
 
 fname = '../data/Adams.pgn'
     
@@ -40,9 +44,25 @@ class HistoricalGame(Game):
             self.result = ''
 
         self._cpTeam = 1
+        self._played = False
 
+    def replay(self):
+        '''
+        Plays the game through with `runGame` the first time it is called,
+        so later calls cost nothing.
+
+        RETURN
+        states -- list of board states from the start of the game to its end
+        '''
+        if not self._played:
+            self.runGame()
+            self._played = True
+        return self.states
    
     def getNextMove(self,team):
+        # The game is over once black has played the last pair of moves
+        if self.movenum > len(self._moves):
+            return None
         notation = self._moves[self.movenum-1]
         if team == Wh and notation[0]:
             return self.parseMove(notation[0],team)
@@ -53,62 +73,198 @@ class HistoricalGame(Game):
 
 
 
-def parsePGN(fname, start_count = 0, max_count = 0, verbose=0):
+_header = re.compile(r'\[(\w+)\s+"(.*)"\]')
+
+class GameFilter:
+    def __init__(self, player = None, eco = None, years = None, result = None, elo = None):
+        '''
+        Predicate on the header tags of a game, for the `select` argument of
+        `read_games` and the functions built on it.
+
+        INPUT
+        player -- only games with a player whose name contains this, ignoring
+            case
+        eco -- only games whose ECO code starts with this
+        years -- (first, last) only games played in these years, inclusive
+        result -- only games with this result, e.g. '1-0'
+        elo -- (low, high) only games in which both players are rated in this
+            range, inclusive
+
+        Criteria left as None match every game.  A game without the tags a
+        criterion needs does not match it.
+        '''
+        self.player = player.lower() if player else None
+        self.eco = eco
+        self.years = years
+        self.result = result
+        self.elo = elo
+
+    def __call__(self, headers):
+        '''
+        INPUT
+        headers -- dictionary of a game's tag pairs
+
+        RETURN
+        * Boolean deciding if the game meets every criterion
+        '''
+        if self.player and not any(self.player in headers.get(side, '').lower() for side in ('White', 'Black')):
+            return False
+        if self.eco and not headers.get('ECO', '').startswith(self.eco):
+            return False
+        if self.result and headers.get('Result') != self.result:
+            return False
+        if self.years:
+            year = headers.get('Date', '')[:4]
+            if not year.isdigit() or not self.years[0] <= int(year) <= self.years[1]:
+                return False
+        if self.elo:
+            for side in ('WhiteElo', 'BlackElo'):
+                elo = headers.get(side, '')
+                if not elo.isdigit() or not self.elo[0] <= int(elo) <= self.elo[1]:
+                    return False
+        return True
+
+def read_games(pgn, start_count = 0, max_count = 0, verbose=0, select=None):
     '''
     INPUT
-    fname -- string name of PGN file
-    start_count -- first game to read in
-    max_count -- maximum number of games to read in
+    pgn -- file object open on a PGN file, read one line at a time
+    start_count -- number of games to skip before the first one considered
+    max_count -- maximum number of games to yield, or 0 for all of them
     verbose -- boolean to print debugging info
+    select -- predicate on a dictionary of a game's header tags, such as a
+        `GameFilter`, or None to yield every game
 
-    RETURN
-    games -- list of game objects read from file
+    YIELD
+    result, moves -- the result string and list of move strings of each game
+        in turn, as `HistoricalGame` takes them
+
+    NOTE
+    * only the move text of the game being read is held in memory, and that
+    of skipped games is not even kept, so files of any size can be streamed.
+
+    * with `select`, only the header lines of games which do not match are
+    parsed.
     '''
-    games = []
     inMoves = False
-    moves = ''
+    moves = []
+    headers = {}
+    wanted = False
     game_count = -1
-    with open(fname) as pgn:
-        for line in pgn.readlines():
-            if verbose: print(line, end='')
-            
-            #Start of a game
-            if line[0] == '1':
-                game_count += 1
-                inMoves = True
-             
-            #End of a game
-            elif inMoves and line == '\n':
-                moves = moves.split()
-                if verbose: print(moves)            
-                if game_count >= start_count:
-                    #Create game object from moves
-                    games.append(HistoricalGame(moves[-1], moves[:-1], verbose))
-                
-                inMoves = False
-                moves = ''
-                
+    yielded = 0
+    for line in pgn:
+        if verbose: print(line, end='')
+
+        #Header of a game
+        if line[0] == '[' and not inMoves:
+            if select:
+                match = _header.match(line)
+                if match:
+                    headers[match.group(1)] = match.group(2)
+
+        #Start of a game (later lines of move text may start with a 1 too)
+        elif line[0] == '1' and not inMoves:
+            game_count += 1
+            inMoves = True
+            wanted = game_count >= start_count and (select is None or select(headers))
+
+        #End of a game
+        elif inMoves and line == '\n':
+            inMoves = False
+            if wanted:
+                if verbose: print(moves)
+                yield moves[-1], moves[:-1]
+                yielded += 1
                 # Read at most max_count games
-                if len(games) == start_count + max_count:
-                    break
-                
-            #Middle of a game
-            if inMoves:
-                moves += line.replace('\n',' ')
-            
-    
-    return games
+                if yielded == max_count:
+                    return
+            moves = []
+            headers = {}
+
+        #Middle of a game
+        if inMoves and wanted:
+            moves += line.split()
+
+    # The last game need not be followed by a blank line
+    if inMoves and wanted and moves:
+        yield moves[-1], moves[:-1]
 
-def only_correct_games(fname, start_count = 0, max_count = 0, verbose=False):
+def read_indexed_game(raw, offset, length, verbose=0):
+    '''
+    INPUT
+    raw -- PGN file open in binary mode
+    offset, length -- position and size in bytes of a game, as recorded in
+        the file's index (see `pgn_index.py`)
+
+    RETURN
+    * iterator over the result and move list of the game, as for
+    `read_games`
+    '''
+    raw.seek(offset)
+    return read_games(io.TextIOWrapper(io.BytesIO(raw.read(length))), 0, 1, verbose)
+
+def stream_games(fname, start_count = 0, max_count = 0, verbose=0, use_index=True, select=None):
     '''
     INPUT
     fname -- string name of PGN file
+    use_index -- boolean to seek straight to game `start_count` using the
+        file's index (see `pgn_index.py`) rather than reading every game
+        before it.  With `select` too, the headers saved in the index are
+        matched instead, and only the games selected are read.
+
+    Other arguments are as for `read_games`.
+
+    YIELD
+    result, moves -- as for `read_games`
+    '''
+    with open(fname, 'rb') as raw:
+        if use_index and select:
+            yielded = 0
+            index = load_index(fname)
+            for number in index.numbers(start_count, select):
+                yield from read_indexed_game(raw, *index[number], verbose)
+                yielded += 1
+                if yielded == max_count:
+                    return
+            return
+        if use_index and start_count:
+            index = load_index(fname)
+            if start_count >= len(index):
+                return
+            raw.seek(index.offsets[start_count])
+            start_count = 0
+        yield from read_games(io.TextIOWrapper(raw), start_count, max_count, verbose, select)
+
+def parsePGN(fname, start_count = 0, max_count = 0, verbose=0, use_index=True, select=None):
+    '''
+    INPUT
+    fname -- string name of PGN file
+    start_count -- first game to read in
+    max_count -- maximum number of games to read in, or 0 for all of them
+    verbose -- boolean to print debugging info
+    use_index -- as for `stream_games`
+    select -- as for `read_games`, e.g. `GameFilter(player='Kasparov')`
+
+    YIELD
+    game -- game object for each game read from file, in order.  The file is
+        read as the games are asked for (see `read_games`).
+    '''
+    for result, moves in stream_games(fname, start_count, max_count, verbose, use_index, select):
+        yield HistoricalGame(result, moves, verbose)
+
+def only_correct_games(fname, start_count = 0, max_count = 0, verbose=False, use_index=True, select=None):
+    '''
+    INPUT
+    fname -- string name of PGN file
+    start_count -- first game to read in
     max_count -- maximum number of games to be read from file
     verbose -- print debugging info
+    use_index -- as for `stream_games`
+    select -- as for `read_games`
 
     YIELD
     The next game from the PGN file which can be parsed correctly and 
-    completely by Game.runGame().
+    completely by Game.runGame().  Each game is only replayed once: it is
+    yielded already played through, and `replay` returns its states.
     
     NOTE
     * specifically, this function checks that Game.runGame()
@@ -119,22 +275,27 @@ def only_correct_games(fname, start_count = 0, max_count = 0, verbose=False):
     occasionally have typos in the game itself, and so failures to parse all
     games in `fname` may be for that reason.  
     '''
+    games = stream_games(fname, start_count, max_count, verbose, use_index, select)
+    yield from correct_games(games, verbose, start_count)
 
-    # The error check code calls runGame() which can only be called once per
-    # game, so they must be regenerated.
-    games = parsePGN(fname, start_count = start_count, max_count=max_count, verbose=verbose)
-    fresh_games = parsePGN(fname, start_count = start_count, max_count=max_count, verbose=verbose)
-    
-    # Identifies games which run without error
-    correct_game_indices = []
-    for i,g in enumerate(games):
+def correct_games(records, verbose=False, first=0):
+    '''
+    INPUT
+    records -- result and move list of each game, as from `read_games`
+    verbose -- print debugging info
+    first -- number of the first game in its file, for reporting failures
+
+    YIELD
+    game -- as for `only_correct_games`
+    '''
+    for i, (result, moves) in enumerate(records, first):
+        game = HistoricalGame(result, moves, verbose)
         try:
-            g.runGame()
-            correct_game_indices.append(i)
-            yield fresh_games[i]
+            game.replay()
         except IndexError:
             print("failed on game ", i)
-            pass
+            continue
+        yield game
     
 
 #def clean_file(fname, indices):
@@ -148,14 +309,15 @@ def only_correct_games(fname, start_count = 0, max_count = 0, verbose=False):
 def gen_pairs(games, start_count = 0):
     '''
     INPUT
-    games -- a list of game states
+    games -- iterable of `HistoricalGame`s, played through here unless they
+        already have been
 
     YIELD
-    state -- 
+    start, end, team, index -- each pair of consecutive board states, the
+        team whose move turned `start` into `end`, and the move's index
     '''
     for gi, game in enumerate(games):
-        game.runGame()
-        states = game.states
+        states = game.replay()
         team = 1
         for i,state in enumerate(states[:-1]):
             yield state, states[i+1], team, i
@@ -163,9 +325,29 @@ def gen_pairs(games, start_count = 0):
             # Alternate team between moves
             team *= -1
 
-def run_history(fname, verbosity):
-    games = only_correct_games(fname, start_count = 0, max_count=1, verbose=verbosity)
-    
+def pgn_files(path):
+    '''
+    INPUT
+    path -- name of a PGN file, of a directory holding PGN files, or a glob
+        pattern matching PGN files
+
+    RETURN
+    files -- sorted list of the PGN files named by `path`
+    '''
+    if os.path.isdir(path):
+        return sorted(glob.glob(os.path.join(path, '*.pgn')))
+    if os.path.exists(path):
+        return [path]
+    return sorted(glob.glob(path))
+
+def check_moves(games, verbosity):
+    '''
+    Checks each move of `games` is found valid by `is_valid_move`, printing
+    the boards of any which are not.
+
+    RETURN
+    correct, total -- number of moves found valid, and of moves checked
+    '''
     correct = 0
     total = 0
     
@@ -178,22 +360,55 @@ def run_history(fname, verbosity):
             print_board(start)
             print_board(end)
             print(team)
-            break
         correct += int(result)
         total += 1
+    return correct, total
+
+def run_history(path, verbosity, start_count = 0, max_count = 1, workers = 1, select = None):
+    '''
+    Checks each move of games `start_count` onwards of each PGN file named by
+    `path` (see `pgn_files`), at most `max_count` of them per file (0 for
+    all), is found valid by `is_valid_move`.  With several files or
+    `workers` > 1 the games are shared out over a process pool (see
+    `ingest.py`).  Only games matching `select`, as for `read_games`, are
+    checked.  `path` may instead name a game archive (see `archive.py`),
+    whose games are replayed without parsing their moves.
+
+    RETURN
+    * fraction of moves found valid
+    '''
+    from archive import GameArchive, ARCHIVE_SUFFIX
+    if path.endswith(ARCHIVE_SUFFIX):
+        archive = GameArchive(path)
+        try:
+            correct, total = check_moves(archive.games(start_count, max_count, select), verbosity)
+        finally:
+            archive.close()
+        if verbosity:print("finished: ", correct , " / " , total)
+        return correct / total if total else 0
+    files = pgn_files(path)
+    if not files:
+        raise FileNotFoundError("no PGN files found at {0}".format(path))
+    if workers > 1 or len(files) > 1:
+        from ingest import ingest
+        correct, total = ingest(files, workers, start_count, max_count, verbosity, select=select)
+    else:
+        games = only_correct_games(files[0], start_count = start_count, max_count=max_count, verbose=verbosity,
+                select=select)
+        correct, total = check_moves(games, verbosity)
     if verbosity:print("finished: ", correct , " / " , total)
-    return correct / total
+    return correct / total if total else 0
 
 if __name__ == "__main__":
 
-    games = only_correct_games(fname, parsePGN(fname))
-    #games[14].runGame(False, True)
     tally = 0
-    for i,g in enumerate(games):
+    total = 0
+    for i,g in enumerate(parsePGN(fname)):
         if i%100==0: print(i)
+        total += 1
         try:
             g.runGame()
             tally += 1
         except IndexError:
             print("failed")
-    print(tally / float(len(games)))
+    print(tally / float(total))
@@ -0,0 +1,107 @@
+'''
+Counters collected over a single search.
+
+The search increments plain integer attributes of a `SearchStats`, which
+costs little next to the work done at each node, so they can be left on at
+all times rather than printed as the search goes.
+'''
+import json
+import time
+
+# Beta cutoffs are counted by the index of the move causing them, with every
+# move from CUTOFF_SLOTS-1 on counted together.
+CUTOFF_SLOTS = 8
+
+class SearchStats:
+    def __init__(self):
+        self.nodes = 0
+        self.leaves = 0
+        self.cutoffs = [0]*CUTOFF_SLOTS
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.tt_cutoffs = 0
+        self.null_cutoffs = 0
+        self.lmr_researches = 0
+        # (depth, nodes, seconds) of each iteration of iterative deepening,
+        # counting only the work of that iteration
+        self.iterations = []
+        self.start = time.perf_counter()
+        self.elapsed = 0
+
+    def finishIteration(self, depth, nodes):
+        '''
+        Records that the search to `depth` finished, with `nodes` the total
+        number of nodes searched so far.
+        '''
+        previous_nodes = sum(n for d, n, t in self.iterations)
+        previous_seconds = sum(t for d, n, t in self.iterations)
+        self.elapsed = time.perf_counter() - self.start
+        self.iterations.append((depth, nodes - previous_nodes, self.elapsed - previous_seconds))
+
+    def add(self, other):
+        '''
+        Adds the counters of `other`, kept by part of the same search made in
+        another process (see `parallel.py`), into these.  Node counts are
+        left to the caller, which passes the total to `finish`.
+        '''
+        self.leaves += other.leaves
+        self.cutoffs = [a + b for a, b in zip(self.cutoffs, other.cutoffs)]
+        self.tt_probes += other.tt_probes
+        self.tt_hits += other.tt_hits
+        self.tt_cutoffs += other.tt_cutoffs
+        self.null_cutoffs += other.null_cutoffs
+        self.lmr_researches += other.lmr_researches
+
+    def finish(self, nodes):
+        self.nodes = nodes
+        self.elapsed = time.perf_counter() - self.start
+
+    def branchingFactors(self):
+        '''
+        RETURN
+        factors -- dictionary mapping each depth after the first to the
+            effective branching factor: how many times more nodes its
+            iteration searched than the one before
+        '''
+        factors = {}
+        for (_, before, _), (depth, nodes, _) in zip(self.iterations, self.iterations[1:]):
+            factors[depth] = nodes / before if before else None
+        return factors
+
+    def nps(self):
+        return self.nodes / self.elapsed if self.elapsed else 0
+
+    def cutoffRate(self):
+        '''
+        RETURN
+        * fraction of beta cutoffs caused by the first move searched, the
+        usual measure of how good the move ordering is
+        '''
+        total = sum(self.cutoffs)
+        return self.cutoffs[0] / total if total else None
+
+    def toDict(self):
+        return {'nodes': self.nodes,
+                'leaves': self.leaves,
+                'seconds': self.elapsed,
+                'nps': self.nps(),
+                'cutoffs': self.cutoffs,
+                'first_move_cutoff_rate': self.cutoffRate(),
+                'tt_probes': self.tt_probes,
+                'tt_hits': self.tt_hits,
+                'tt_cutoffs': self.tt_cutoffs,
+                'null_cutoffs': self.null_cutoffs,
+                'lmr_researches': self.lmr_researches,
+                'iterations': [{'depth': d, 'nodes': n, 'seconds': t} for d, n, t in self.iterations],
+                'branching_factors': self.branchingFactors()}
+
+    def dump(self, filename, **extra):
+        '''
+        Appends the stats to `filename` as one line of JSON, along with any
+        `extra` fields, so a whole game's searches can be collected in one
+        file.
+        '''
+        record = self.toDict()
+        record.update(extra)
+        with open(filename, 'a') as f:
+            f.write(json.dumps(record) + "\n")
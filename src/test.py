@@ -1,4 +1,14 @@
+import os
+import io
+import json
 from game import *
+from bitboard import BitBoard
+from play import *
+from parallel import ParallelEngine
+from read_pgn import GameFilter, HistoricalGame, gen_pairs, read_games, parsePGN, only_correct_games, check_moves, pgn_files, run_history
+from pgn_index import load_index, index_path
+from ingest import ingest, shard_files, SHARD_BYTES
+from archive import GameArchive, write_archive
 
 class TestGame(Game):
     def __init__(self, verbosity=0):
@@ -36,10 +46,16 @@ class TestGame(Game):
         parsing_tests = self.pawnTests() + self.castlingTests() + self.knightTests() + self.kingTests()
         string_tests = self.boardStringTests()
         cli_tests = self.commandLineTests()
+        movegen_tests = self.bitboardTests() + self.attackTests() + self.legalMoveTests() + self.hashTests()
         print("{0} parsing tests".format(len(parsing_tests)))
         print("{0} memory tests".format(len(string_tests)))
         print("{0} cli tests".format(len(cli_tests)))
-        tests = parsing_tests + string_tests + cli_tests
+        search_tests = self.searchTests()
+        pgn_tests = self.pgnTests()
+        print("{0} move generation tests".format(len(movegen_tests)))
+        print("{0} search tests".format(len(search_tests)))
+        print("{0} pgn tests".format(len(pgn_tests)))
+        tests = parsing_tests + string_tests + cli_tests + movegen_tests + search_tests + pgn_tests
         
         return self.executeTests(tests, rerun_failed)
     
@@ -52,10 +68,148 @@ class TestGame(Game):
     def commandLineTests(self):
         tests = (
                 (self.testCommandLine, 'main.py hist 0', False),
+                (self.testCommandLine, 'main.py perft 2', False),
                 #(self.testCommandLine, 'main.py hist 1', False),
                 )
         return tests
 
+    ##############################
+    ###
+    ### MOVE GENERATION TESTS
+    ###
+    ##############################
+
+    def bitboardTests(self):
+        tests = (
+                (self.testBitBoard, True),
+                (self.testMakeMove, 'e4', [2,5], [4,5], False, None, False),
+                (self.testMakeMove, 'd5', [7,4], [5,4], False, None, False),
+                (self.testBitBoard, False),
+                (self.testMakeMove, 'exd5', [4,5], [5,4], False, None, False),
+                (self.testMakeMove, 'e5', [7,5], [5,5], False, None, False),
+                (self.testBitBoard, False),
+                (self.testMakeUnmake, False),
+                )
+        return tests
+
+    def attackTests(self):
+        openFiles = [[empty,2,4], [empty,7,4], [empty,2,6]]
+        bishopCheck = [[empty,2,6], [Bl*B,3,7]]
+        tests = (
+                (self.testSquareAttacked, [], (3,3), Wh, True, True),
+                (self.testSquareAttacked, [], (4,4), Wh, False, True),
+                (self.testSquareAttacked, [], (6,1), Bl, True, True),
+                (self.testSquareAttacked, [], (5,5), Bl, False, True),
+                (self.testSquareAttacked, openFiles, (8,4), Wh, True, True),
+                (self.testSquareAttacked, openFiles, (2,4), Bl, True, True),
+                (self.testSquareAttacked, openFiles, (6,8), Wh, True, True),
+                (self.testSquareAttacked, openFiles, (4,8), Bl, False, True),
+                (self.testInCheck, [], Wh, False, True),
+                (self.testInCheck, bishopCheck, Wh, True, True),
+                (self.testInCheck, bishopCheck, Bl, False, True),
+                )
+        return tests
+
+    def legalMoveTests(self):
+        castlingPaths = [[empty,1,2], [empty,1,3], [empty,1,4], [empty,1,6], [empty,1,7]]
+        castlingThroughCheck = castlingPaths + [[empty,2,6], [Bl*R,5,6]]
+        pinnedKnight = [[Wh*N,2,5], [Bl*R,5,5]]
+        tests = (
+                (self.testLegalMoves, [], Wh, 20, [(N,1,2,3,3)], [], True),
+                (self.testLegalMoves, [], Bl, 20, [(P,7,5,5,5)], [], True),
+                (self.testLegalMoves, castlingPaths, Wh, None, [(K,1,5,1,7), (K,1,5,1,3)], [], True),
+                (self.testLegalMoves, castlingThroughCheck, Wh, None, [(K,1,5,1,3)], [(K,1,5,1,7), (K,1,5,1,6)], True),
+                (self.testLegalMoves, pinnedKnight, Wh, None, [], [(N,2,5,4,4), (N,2,5,3,3)], True),
+                )
+        return tests
+
+    def hashTests(self):
+        knightsOut = [((1,7),(3,6)), ((8,7),(6,6)), ((3,6),(1,7)), ((6,6),(8,7))]
+        kiwipete = 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq -'
+        tests = (
+                (self.testZobristTree, kiwipete, 2, True),
+                (self.testZobristTree, '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - -', 3, True),
+                (self.testZobristPath, knightsOut, True, True),
+                (self.testZobristPath, knightsOut[:2], False, True),
+                )
+        return tests
+
+    ##############################
+    ###
+    ### SEARCH TESTS
+    ###
+    ##############################
+
+    def searchTests(self):
+        backRankMate = '6k1/5ppp/8/8/8/8/8/R5K1 w - -'
+        kiwipete = 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq -'
+        tests = (
+                (self.testTranspositionTable, True),
+                (self.testSearch, backRankMate, 3, (R,1,1,8,1), True),
+                (self.testSearch, '7k/5Q2/6K1/8/8/8/8/8 b - -', 2, None, True),
+                (self.testSearchReuse, '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - -', 4, True),
+                (self.testEvaluate, kiwipete, True),
+                (self.testEvaluate, '4k3/8/8/8/3Q4/8/8/8 w - -', True),
+                (self.testEvaluateArray, kiwipete, True),
+                (self.testEvaluateArray, '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - -', True),
+                (self.testIncrementalEval, kiwipete, 2, True),
+                (self.testQuiesce, 'k7/8/8/3q4/8/8/3R4/K7 w - -', 10, True),
+                (self.testQuiesce, 'k7/8/2p5/3p4/8/8/3Q4/K7 w - -', 0, True),
+                (self.testSearchAvoids, 'k7/8/2p5/3p4/8/8/3Q4/K7 w - -', 1, (Q,2,4,5,4), True),
+                (self.testMoveOrdering, 'k7/8/8/3q4/4P3/2N5/8/K7 w - -', [(P,4,5,5,4), (N,3,3,5,4)], True),
+                (self.testMoveOrdering, '7k/P7/8/8/8/8/7r/K7 w - -', [(Q,7,1,8,1), (R,7,1,8,1)], True),
+                (self.testParallelSearch, '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - -', 3, True),
+                (self.testParallelBudget, kiwipete, 5000, True),
+                (self.testWorkerOptions, {'pvs': False, 'null_move': 3, 'lmr': 0, 'seed': 5}, True),
+                (self.testSearchOptions, '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - -', 4, True),
+                (self.testSearchOptions, kiwipete, 3, True),
+                (self.testNullMove, 'k7/8/8/8/4P3/8/8/K7 b - e3', Wh, False, True),
+                (self.testNullMove, 'k7/8/8/8/4P3/8/8/K7 w - -', Wh, False, True),
+                (self.testNullMove, kiwipete, Wh, True, True),
+                (self.testReductions, kiwipete, 4, {'null_move': 3, 'lmr': 3}, True),
+                (self.testReductions, 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq -', 5, {'null_move': 3, 'lmr': 0}, True),
+                (self.testSearchStats, kiwipete, 3, True),
+                (self.testThink, {'nodes': 2000}, True),
+                (self.testThink, {'movetime': 0.3}, True),
+                (self.testThink, {'max_depth': 2}, True),
+                (self.testPonder, '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - -', 3, True),
+                )
+        return tests
+
+    ##############################
+    ###
+    ### PGN TESTS
+    ###
+    ##############################
+
+    def pgnTests(self):
+        three_games = ('[White "a"]\n\n1.e4 e5 2.Nf3 1-0\n\n'
+                '[White "b"]\n\n1.d4 d5 2.c4 dxc4\n3.e3 0-1\n\n'
+                '[White "c"]\n\n1.c4 1/2-1/2\n')
+        tests = (
+                (self.testReadGames, three_games, 0, 0, ['1.e4', '1.d4', '1.c4'], True),
+                (self.testReadGames, three_games, 1, 0, ['1.d4', '1.c4'], True),
+                (self.testReadGames, three_games, 1, 1, ['1.d4'], True),
+                (self.testReadGames, three_games + '\n', 2, 5, ['1.c4'], True),
+                (self.testParsePGN, '../data/Adams.pgn', 3, 2, True),
+                (self.testParsePGN, '../data/Adams.pgn', 2000, 3, True),
+                (self.testPGNIndex, three_games, True),
+                (self.testPGNIndex, three_games.replace('\n', '\r\n') + '\r\n', True),
+                (self.testCommandLine, 'main.py hist 0 --start=3 --count=2', False),
+                (self.testIngest, '../data/Adams.pgn', 6, 1, True),
+                (self.testReplay, '1-0', '1.e4 e5 2.Qh5 Nc6 3.Bc4 Nf6 4.Qxf7#', True),
+                (self.testReplay, '0-1', '1.f3 e5 2.g4 Qh4#', True),
+                (self.testGameFilter, {'player': 'short'}, True),
+                (self.testGameFilter, {'eco': 'B1', 'result': '1-0'}, True),
+                (self.testGameFilter, {'years': (1990, 1992), 'elo': (2500, 2700)}, True),
+                (self.testArchive, '../data/Adams.pgn', 40, None, True),
+                (self.testArchive, '../data/Adams.pgn', 40, {'eco': 'B'}, True),
+                (self.testCommandLine, 'main.py hist 0 --player=Kasparov --eco=B --years=1990-1999 --count=1', False),
+                (self.testIngest, '../data/Adams.pgn', 6, 2, True),
+                (self.testShardSize, '../data/Adams.pgn', 2, True),
+                )
+        return tests
+
     ##############################
     ###
     ### MEMORY TESTS
@@ -204,6 +358,532 @@ class TestGame(Game):
         assertions = [piece == board_piece]
         return self.testTally(assertions, "boardtest " + str(test_num))
     
+    def testBitBoard(self, test_num):
+        '''
+        Converts `self.board` to a `BitBoard` and back, and checks both
+        representations generate the same moves for each team.
+        '''
+        bitboard = BitBoard.fromArray(self.board)
+        assertions = [(bitboard.toArray() == self.board).all(),
+                set(bitboard.possibleMoves(Wh)) == set(possible_moves(self.board, Wh)),
+                set(bitboard.possibleMoves(Bl)) == set(possible_moves(self.board, Bl)),
+                set(bitboard.possibleMoves(Wh, pieceloc=(1,2))) == set(possible_moves(self.board, Wh, pieceloc=(1,2)))]
+        return self.testTally(assertions, "bitboardtest " + str(test_num))
+
+    def testMakeUnmake(self, test_num):
+        '''
+        Makes and unmakes every move available to the team to play, checking
+        each one leaves `self.board` exactly as it was and survives packing
+        into and out of the 16-bit move format.
+        '''
+        before = self.board.copy()
+        assertions = []
+        for move in legal_move_codes(self.board, self.turn):
+            undo = make_move(self.board, move, self.turn)
+            assertions.append(not (self.board == before).all())
+            unmake_move(self.board, undo)
+            assertions.append(encode_move(decode_move(move, self.board), self.board) == move)
+            assertions.append((self.board == before).all())
+        return self.testTally(assertions, "makemovetest " + str(test_num))
+
+    def testZobristTree(self, fen, depth, test_num):
+        '''
+        Walks every line of play `depth` plies deep from `fen`, checking the
+        incrementally updated hash matches one computed from scratch.
+        '''
+        board, team = fen_to_board(fen)
+        assertions = []
+        def walk(key, team, depth):
+            assertions.append(key == hash_board(board, team))
+            if depth == 0:
+                return
+            for move in legal_move_codes(board, team):
+                undo = make_move(board, move, team)
+                walk(update_key(key, board, undo), -team, depth-1)
+                unmake_move(board, undo)
+        walk(hash_board(board, team), team, depth)
+        return self.testTally(assertions, "zobristtest " + str(test_num))
+
+    def testZobristPath(self, moves, transposes, test_num):
+        '''
+        Plays `moves` with `movePiece`, and checks whether the hash returns to
+        that of the starting position exactly when `transposes` says it should.
+        '''
+        start_key = key = hash_board(self.board, self.turn)
+        team = self.turn
+        for start, end in moves:
+            key = movePiece(self.board, start, end, team, key=key)
+            team = -team
+        assertions = [key == hash_board(self.board, team)]
+        assertions.append((key == start_key) == transposes)
+        return self.testTally(assertions, "zobristtest " + str(test_num))
+
+    def testTranspositionTable(self, test_num):
+        '''
+        Fills a single bucket and checks which entries survive.
+        '''
+        tt = TranspositionTable(0)
+        deep, shallow, newer = 1, 1 + tt.buckets, 1 + 2*tt.buckets
+        tt.store(deep, 5, EXACT, 1.5, 100)
+        tt.store(shallow, 2, LOWER, -3, 200)
+        assertions = [tt.probe(deep) == (5, EXACT, 1.5, 100)]
+        assertions.append(tt.probe(shallow) == (2, LOWER, -3, 200))
+        # The shallower entry is pushed out of the always-replace slot
+        tt.store(newer, 1, UPPER, 0, 300)
+        assertions.append(tt.probe(shallow) is None)
+        assertions.append(tt.probe(deep) is not None)
+        # The deep entry gives way once a new search starts
+        tt.newSearch()
+        tt.store(shallow, 2, LOWER, -3, 200)
+        assertions.append(tt.probe(deep) is None)
+        assertions.append(tt.probe(shallow) == (2, LOWER, -3, 200))
+        return self.testTally(assertions, "tttest " + str(test_num))
+
+    def testSearch(self, fen, depth, expected, test_num):
+        '''
+        Checks the search finds `expected` (a 5-tuple), or that it reports
+        stalemate with a score of 0 if `expected` is None.
+        '''
+        board, team = fen_to_board(fen)
+        move, score = Engine().search(board, depth, team)
+        if expected is None:
+            assertions = [move is None, score == 0]
+        else:
+            assertions = [decode_move(move, board) == expected, score > MATE - MAXPLY]
+        return self.testTally(assertions, "searchtest " + str(test_num))
+
+    def testSearchReuse(self, fen, depth, test_num):
+        '''
+        Searching the same position again should mostly be answered from the
+        transposition table.
+        '''
+        board, team = fen_to_board(fen)
+        engine = Engine()
+        first = engine.search(board, depth, team)
+        first_nodes = engine.nodes
+        second = engine.search(board, depth, team)
+        assertions = [first[1] == second[1], engine.nodes * 10 < first_nodes]
+        return self.testTally(assertions, "searchtest " + str(test_num))
+
+    def testEvaluate(self, fen, test_num):
+        board, team = fen_to_board(fen)
+        assertions = [abs(evaluate(board) - score_board(board)) < eps]
+        return self.testTally(assertions, "evaltest " + str(test_num))
+
+    def testEvaluateArray(self, fen, test_num):
+        '''
+        Checks the vectorized scores of a board and of the stack of all its
+        children match the scalar ones.
+        '''
+        board, team = fen_to_board(fen)
+        moves = legal_move_codes(board, team)
+        scores = evaluate_moves(board, moves, team)
+        assertions = [abs(evaluate_array(board) - evaluate(board)) < eps]
+        for move, score in zip(moves, scores):
+            undo = make_move(board, move, team)
+            assertions.append(abs(score - evaluate(board)) < eps)
+            unmake_move(board, undo)
+        return self.testTally(assertions, "evaltest " + str(test_num))
+
+    def testIncrementalEval(self, fen, depth, test_num):
+        '''
+        Searches with the incremental score checked against `score_board`
+        at every leaf.
+        '''
+        board, team = fen_to_board(fen)
+        try:
+            Engine(check_eval=True).think(board, team, depth)
+            assertions = [True]
+        except Exception as e:
+            print(e)
+            assertions = [False]
+        return self.testTally(assertions, "evaltest " + str(test_num))
+
+    def testQuiesce(self, fen, expected_gain, test_num):
+        '''
+        Checks the quiescence score improves on the static score of `fen` by
+        about `expected_gain`, i.e. that exchanges are played out.
+        '''
+        board, team = fen_to_board(fen)
+        static = team*score_board(board)
+        engine = Engine()
+        engine.score = evaluate(board)
+        score = engine._quiesce(board, -INF, INF, team, 0)
+        assertions = [abs(score - static - expected_gain) < 1.5]
+        return self.testTally(assertions, "quiescetest " + str(test_num))
+
+    def testSearchAvoids(self, fen, depth, bad_move, test_num):
+        board, team = fen_to_board(fen)
+        move, score = Engine().search(board, depth, team)
+        assertions = [decode_move(move, board) != bad_move]
+        return self.testTally(assertions, "searchtest " + str(test_num))
+
+    def testMoveOrdering(self, fen, expected, test_num):
+        '''
+        Checks the first moves searched are `expected`, in order.
+        '''
+        board, team = fen_to_board(fen)
+        moves = Engine().orderMoves(board, legal_move_codes(board, team), None, 0, team)
+        ordered = [decode_move(move, board) for move in moves[:len(expected)]]
+        assertions = [ordered == expected]
+        return self.testTally(assertions, "ordertest " + str(test_num))
+
+    def testParallelSearch(self, fen, depth, test_num):
+        '''
+        A search split over worker processes should agree with the serial
+        search on the score of the position, and its stats should count the
+        workers' share of the search.
+        '''
+        board, team = fen_to_board(fen)
+        serial = Engine()
+        move, score = serial.think(board, team, depth)
+        engine = ParallelEngine(2)
+        try:
+            parallel_move, parallel_score = engine.think(board, team, depth)
+        finally:
+            engine.close()
+        assertions = [abs(score - parallel_score) < eps]
+        assertions.append(parallel_move in legal_move_codes(board, team))
+        stats = engine.stats
+        assertions.append(stats.nodes == engine.nodes)
+        # Most nodes are leaves, in the workers as in the serial search
+        assertions.append(stats.leaves > stats.nodes / 4 and serial.stats.leaves > serial.stats.nodes / 4)
+        assertions.append(sum(stats.cutoffs) > 0 and stats.tt_probes > depth)
+        return self.testTally(assertions, "paralleltest " + str(test_num))
+
+    def testParallelBudget(self, fen, nodes, test_num):
+        '''
+        A node budget is shared by the workers, so a parallel search stops
+        within a check interval of each worker past it.
+        '''
+        board, team = fen_to_board(fen)
+        engine = ParallelEngine(2)
+        try:
+            move = engine.think(board, team, MAXPLY, nodes=nodes)[0]
+        finally:
+            engine.close()
+        assertions = [move in legal_move_codes(board, team)]
+        assertions.append(nodes <= engine.nodes <= nodes + 256*engine.workers)
+        assertions.append(engine.shared_nodes.value == engine.nodes)
+        return self.testTally(assertions, "parallelbudgettest " + str(test_num))
+
+    def testWorkerOptions(self, options, test_num):
+        '''
+        Checks the engines of a `ParallelEngine`'s workers are built with
+        its search options.
+        '''
+        engine = ParallelEngine(1, DEFAULT_MEGABYTES, None, None, None, **options)
+        try:
+            settings = engine.pool.submit(worker_settings).result()
+        finally:
+            engine.close()
+        assertions = [settings[name] == value for name, value in options.items() if name != 'seed']
+        assertions.append(settings['seeded'] == ('seed' in options))
+        return self.testTally(assertions, "workeroptionstest " + str(test_num))
+
+    def testSearchOptions(self, fen, depth, test_num):
+        '''
+        PVS and aspiration windows only change how much of the tree is
+        searched, not the score found.
+        '''
+        board, team = fen_to_board(fen)
+        scores = []
+        for options in ({'pvs': False}, {'pvs': True}, {'pvs': True, 'aspiration': .25}):
+            move, score = Engine(**options).think(board, team, depth)
+            scores.append(score)
+        assertions = [abs(score - scores[0]) < eps for score in scores]
+        return self.testTally(assertions, "searchtest " + str(test_num))
+
+    def testReductions(self, fen, depth, options, test_num):
+        '''
+        Searches with reductions deep enough to take the depth left below
+        zero, which must still end in the quiescence search.
+        '''
+        board, team = fen_to_board(fen)
+        engine = Engine(**options)
+        move, score = engine.think(board, team, depth)
+        assertions = [move in legal_move_codes(board, team)]
+        assertions.append([d for d, n, t in engine.stats.iterations] == list(range(1, depth+1)))
+        return self.testTally(assertions, "reductiontest " + str(test_num))
+
+    def testNullMove(self, fen, team, has_pieces_expected, test_num):
+        '''
+        Passes the turn of `team`, checking its fresh pawns revert, the hash
+        follows and the board is restored after, and checks whether the null
+        move would be allowed outside of a pawn endgame.
+        '''
+        board, _ = fen_to_board(fen)
+        before = board.copy()
+        key = hash_board(board, team)
+        undo = make_null_move(board, team)
+        assertions = [team*fP not in board]
+        assertions.append(update_key(key, board, undo) == hash_board(board, -team))
+        unmake_move(board, undo)
+        assertions.append((board == before).all())
+        assertions.append(has_pieces(board, team) == has_pieces_expected)
+        return self.testTally(assertions, "nullmovetest " + str(test_num))
+
+    def testSearchStats(self, fen, depth, test_num):
+        '''
+        Checks the stats returned by a movemaker add up, and survive a round
+        trip through JSON.
+        '''
+        board, team = fen_to_board(fen)
+        stats_file = 'test_stats.json'
+        engine = Engine(depth=depth, stats_file=stats_file)
+        response, stats = engine.move(board, team, 10, return_stats=True)
+        with open(stats_file) as f:
+            record = json.loads(f.readlines()[-1])
+        os.remove(stats_file)
+        assertions = [stats.nodes == engine.nodes]
+        assertions.append([d for d, n, t in stats.iterations] == list(range(1, depth+1)))
+        assertions.append(sum(n for d, n, t in stats.iterations) == stats.nodes)
+        assertions.append(0 < sum(t for d, n, t in stats.iterations) <= stats.elapsed + eps)
+        assertions.append(0 < stats.leaves < stats.nodes)
+        assertions.append(stats.tt_hits <= stats.tt_probes)
+        assertions.append(sum(stats.cutoffs) > 0)
+        assertions.append(set(stats.branchingFactors()) == set(range(2, depth+1)))
+        assertions.append(record['nodes'] == stats.nodes and record['movenum'] == 10)
+        return self.testTally(assertions, "statstest " + str(test_num))
+
+    def testThink(self, limits, test_num):
+        '''
+        Runs an iterative deepening search from the current board within
+        `limits`, checking the budget is kept and a legal move comes back.
+        '''
+        engine = Engine()
+        start = time.perf_counter()
+        move, score = engine.think(self.board, self.turn, **limits)
+        elapsed = time.perf_counter() - start
+        assertions = [move in legal_move_codes(self.board, self.turn)]
+        assertions.append(engine.nodes <= limits.get('nodes', engine.nodes))
+        assertions.append(elapsed < limits.get('movetime', elapsed) + 0.1)
+        assertions.append(len(engine.pv) <= limits.get('max_depth', MAXPLY))
+        assertions.append(engine.pv[0][1] == move)
+        return self.testTally(assertions, "thinktest " + str(test_num))
+
+    def testPonder(self, fen, depth, test_num):
+        '''
+        Ponders on the reply the engine expects after its move, then plays
+        that reply and checks the engine answers from the pondering search.
+        '''
+        board, team = fen_to_board(fen)
+        engine = Engine(depth=depth)
+        make_move(board, engine.think(board, team, depth)[0], team)
+        predicted = engine.pv[1][1]
+        last_stats = engine.stats
+        engine.ponder(board, -team)
+        deadline = time.perf_counter() + 10
+        while (engine.stats is last_stats or not engine.stats.iterations
+                or engine.stats.iterations[-1][0] < depth):
+            if time.perf_counter() > deadline:
+                break
+            time.sleep(.01)
+        engine.stopPondering()
+        make_move(board, predicted, -team)
+        move = engine.move(board, team, 10)
+        assertions = [engine.ponder_hits == 1]
+        assertions.append(engine._pondering is None and not engine._stop)
+        assertions.append(move is not None)
+        # Pondering on a position which is not reached gives no answer
+        engine.ponder(board, -team)
+        engine.stopPondering()
+        engine.move(board, team, 10)
+        assertions.append(engine.ponder_hits == 1)
+        return self.testTally(assertions, "pondertest " + str(test_num))
+
+    def testReadGames(self, text, start_count, max_count, first_moves, test_num):
+        '''
+        Streams games from the PGN `text`, checking which are read and that
+        each game's moves are split out whole.
+        '''
+        games = list(read_games(io.StringIO(text), start_count, max_count))
+        assertions = [[moves[0] for result, moves in games] == first_moves]
+        assertions.append(all(result in ('1-0', '0-1', '1/2-1/2') for result, moves in games))
+        assertions.append(all(len(moves) == 5 for result, moves in games if moves[0] == '1.d4'))
+        return self.testTally(assertions, "readgamestest " + str(test_num))
+
+    def testParsePGN(self, fname, start_count, max_count, test_num):
+        '''
+        Checks `parsePGN`, seeking by the file's index, picks out the same
+        games as reading the whole file.
+        '''
+        with open(fname) as pgn:
+            every = list(read_games(pgn))
+        games = list(parsePGN(fname, start_count, max_count))
+        wanted = every[start_count:start_count+max_count]
+        assertions = [len(games) == max_count]
+        assertions += [game._moves[0][0] == moves[0].split('.')[1] and game.result == result.split('-')[0]
+                for game, (result, moves) in zip(games, wanted)]
+        return self.testTally(assertions, "parsepgntest " + str(test_num))
+
+    def testPGNIndex(self, text, test_num):
+        '''
+        Indexes the PGN `text`, checking every game can be read from its
+        offset and that the index is rebuilt once the file changes.
+        '''
+        fname = 'test_index.pgn'
+        with open(fname, 'wb') as f:
+            f.write(text.encode())
+        index = load_index(fname)
+        with open(fname, 'rb') as f:
+            data = f.read()
+            games = list(read_games(io.StringIO(data.decode().replace('\r\n', '\n'))))
+        assertions = [len(index) == len(games)]
+        for (offset, length), game in zip(index, games):
+            chunk = data[offset:offset+length].decode().replace('\r\n', '\n')
+            assertions.append(list(read_games(io.StringIO(chunk))) == [game])
+        assertions.append([headers['White'] for headers in index.headers()] == ['a', 'b', 'c'])
+        saved = load_index(fname)
+        assertions.append(os.path.exists(index_path(fname)) and saved._headers is None)
+        assertions.append(list(saved.numbers(1)) == [1, 2] and saved._headers is None)
+        assertions.append(saved == index)
+        assertions.append([g._moves[0][0] for g in parsePGN(fname, 1)] == ['d4', 'c4'])
+        with open(fname, 'ab') as f:
+            f.write(b'\n[White "d"]\n\n1.f4 0-1\n\n')
+        assertions.append(len(load_index(fname)) == len(index) + 1)
+        assertions.append([g._moves[0][0] for g in parsePGN(fname, 3)] == ['f4'])
+        os.remove(fname)
+        os.remove(index_path(fname))
+        return self.testTally(assertions, "pgnindextest " + str(test_num))
+
+    def testIngest(self, fname, games, workers, test_num):
+        '''
+        Splits the first `games` games of `fname` over two files in a
+        directory and checks them over `workers` processes, in shards small
+        enough that each file is split up, comparing the tallies with
+        checking each file on its own.
+        '''
+        directory = 'test_ingest'
+        os.makedirs(directory, exist_ok=True)
+        index = load_index(fname)
+        with open(fname, 'rb') as f:
+            data = f.read()
+        files = [os.path.join(directory, name) for name in ('a.pgn', 'b.pgn')]
+        half = games // 2
+        for name, (first, last) in zip(files, ((0, half), (half, games))):
+            with open(name, 'wb') as f:
+                f.write(data[index.offsets[first]:index.offsets[last-1]+index.lengths[last-1]] + b'\n')
+        shard_bytes = max(index.lengths[:games])
+        shards = shard_files(pgn_files(directory), shard_bytes=shard_bytes)
+        serial = [check_moves(only_correct_games(name, use_index=False), 0) for name in files]
+        assertions = [len(shards) > 2]
+        assertions.append(sum(count for _, _, count, _ in shards) == games)
+        assertions.append(ingest(pgn_files(directory), workers, shard_bytes=shard_bytes) ==
+                tuple(map(sum, zip(*serial))))
+        assertions.append(run_history(directory + '/*.pgn', 0, 0, 0, workers) ==
+                sum(c for c, t in serial) / sum(t for c, t in serial))
+        for name in files:
+            os.remove(name)
+            if os.path.exists(index_path(name)):
+                os.remove(index_path(name))
+        os.rmdir(directory)
+        return self.testTally(assertions, "ingesttest " + str(test_num))
+
+    def testShardSize(self, fname, workers, test_num):
+        '''
+        At the default shard size, a single file smaller than `SHARD_BYTES`
+        is still split up between several workers, but not for one.
+        '''
+        games = len(load_index(fname))
+        shards = shard_files([fname], workers=workers)
+        assertions = [os.path.getsize(fname) < SHARD_BYTES]
+        assertions.append(len(shards) > 1)
+        assertions.append(sum(count for _, _, count, _ in shards) == games)
+        assertions.append(len(shard_files([fname])) == 1)
+        return self.testTally(assertions, "shardsizetest " + str(test_num))
+
+    def testReplay(self, result, movetext, test_num):
+        '''
+        Replays a game ending on either side's move, checking every move is
+        played and that a second replay reuses the first.
+        '''
+        moves = movetext.split()
+        plies = len(moves)
+        game = HistoricalGame(result, list(moves))
+        states = game.replay()
+        assertions = [len(states) == plies + 1]
+        assertions.append(is_in_check(states[-1], -1 if result == '1-0' else 1))
+        assertions.append(game.replay() is states and len(states) == plies + 1)
+        pairs = list(gen_pairs([game]))
+        assertions.append(len(pairs) == plies and pairs[-1][2] == (1 if plies % 2 else -1))
+        return self.testTally(assertions, "replaytest " + str(test_num))
+
+    def testGameFilter(self, criteria, test_num):
+        '''
+        Selects games from Adams.pgn by `criteria`, checking reading the
+        file, seeking by its index and checking the index's headers all
+        agree.
+        '''
+        fname = '../data/Adams.pgn'
+        select = GameFilter(**criteria)
+        expected = list(load_index(fname).numbers(0, select))
+        with open(fname) as pgn:
+            every = list(read_games(pgn))
+        with open(fname) as pgn:
+            scanned = list(read_games(pgn, select=select))
+        indexed = list(parsePGN(fname, 10, 3, select=select))
+        assertions = [0 < len(expected) < len(every)]
+        assertions.append(scanned == [every[number] for number in expected])
+        wanted = [every[number] for number in expected if number >= 10][:3]
+        assertions.append([game._moves[0][0] for game in indexed] == [moves[0].split('.')[1] for result, moves in wanted])
+        return self.testTally(assertions, "gamefiltertest " + str(test_num))
+
+    def testArchive(self, fname, games, criteria, test_num):
+        '''
+        Archives the first `games` games of `fname`, checking the archive
+        replays every game to the same states as the PGN file does, and that
+        `run_history` gives the same result from either.
+        '''
+        pgn_name, archive_name = 'test_archive.pgn', 'test_archive.arc'
+        index = load_index(fname)
+        with open(fname, 'rb') as f:
+            data = f.read(sum(index[games-1]))
+        with open(pgn_name, 'wb') as f:
+            f.write(data)
+        select = GameFilter(**criteria) if criteria else None
+        written, failed = write_archive(pgn_name, archive_name, select)
+        expected = list(only_correct_games(pgn_name, select=select))
+        archive = GameArchive(archive_name)
+        archived = list(archive.games())
+        assertions = [len(archive) == written == len(expected) and 0 < written + failed <= games]
+        for game, replayed in zip(archived, expected):
+            states = game.replay()
+            assertions.append(len(states) == len(replayed.states) and
+                    all((a == b).all() for a, b in zip(states, replayed.states)))
+            assertions.append(game.result == replayed.result)
+        assertions.append(select is None or all(select(game.headers) for game in archived))
+        assertions.append([g.headers for g in archive.games(2, 3)] == [g.headers for g in archived[2:5]])
+        archive.close()
+        assertions.append(run_history(archive_name, 0, 0, 0) == run_history(pgn_name, 0, 0, 0, select=select))
+        try:
+            GameArchive(pgn_name)
+            assertions.append(False)
+        except ValueError:
+            pass
+        for name in (pgn_name, archive_name, index_path(pgn_name)):
+            if os.path.exists(name):
+                os.remove(name)
+        return self.testTally(assertions, "archivetest " + str(test_num))
+
+    def testLegalMoves(self, setup, team, count, included, excluded, test_num):
+        if setup: self.addPiecesToBoard(setup)
+        moves = legal_moves(self.board, team)
+        assertions = [count is None or len(moves) == count]
+        assertions += [move in moves for move in included]
+        assertions += [move not in moves for move in excluded]
+        return self.testTally(assertions, "legalmovetest " + str(test_num))
+
+    def testSquareAttacked(self, setup, square, by_team, expected, test_num):
+        if setup: self.addPiecesToBoard(setup)
+        assertions = [is_square_attacked(self.board, square, by_team) == expected]
+        return self.testTally(assertions, "attacktest " + str(test_num))
+
+    def testInCheck(self, setup, team, expected, test_num):
+        if setup: self.addPiecesToBoard(setup)
+        assertions = [is_in_check(self.board, team) == expected]
+        return self.testTally(assertions, "checktest " + str(test_num))
+
     def testBoardString(self, test_num):
         '''
         Save current `self.board` to file, then reload board from file
@@ -277,6 +957,17 @@ class TestGame(Game):
         for piece,r,c in positions:
             setCoord(self.board,r,c,piece) 
 
+def worker_settings():
+    '''
+    RETURN
+    * the search options of the engine of the `parallel` worker process
+    this runs in
+    '''
+    import parallel
+    engine = parallel._worker_engine
+    return {'pvs': engine.pvs, 'null_move': engine.null_move, 'lmr': engine.lmr,
+            'lmr_moves': engine.lmr_moves, 'check_eval': engine.check_eval, 'seeded': engine.rng is not None}
+
 def run_tests(verbosity):
     game = TestGame(verbosity)
     result = game.runAllTests()
@@ -0,0 +1,96 @@
+'''
+Fixed-size transposition table for the search.
+
+Entries are kept in parallel `array`s rather than a dictionary so the table's
+memory use is fixed when it is created, no matter how long a session runs.
+The table is split into buckets of two slots, each indexed by the position's
+Zobrist hash (see `zobrist.py`):
+
+* the first slot is depth-preferred: it is only overwritten by a search at
+  least as deep, or once its entry is left over from an earlier search.
+* the second slot is always replaced, so recent positions are remembered
+  even when the first slot holds a deeper result.
+
+The full 64-bit hash is stored alongside each entry to tell apart the many
+positions which share a bucket.
+'''
+from array import array
+
+# Score bound types
+EXACT = 0
+LOWER = 1 # score is at least the stored value (the search failed high)
+UPPER = 2 # score is at most the stored value (the search failed low)
+
+# Bytes used per slot: hash 'Q', score 'd', move 'H', depth 'b', flag 'B', age 'B'
+ENTRY_BYTES = 8 + 8 + 2 + 1 + 1 + 1
+DEFAULT_MEGABYTES = 16
+
+class TranspositionTable:
+    def __init__(self, megabytes = DEFAULT_MEGABYTES):
+        '''
+        INPUT
+        megabytes -- upper bound on the memory held by the table's entries
+        '''
+        self.buckets = max(1, int(megabytes * 2**20) // (2*ENTRY_BYTES))
+        self.age = 0
+        self.clear()
+
+    def clear(self):
+        size = 2*self.buckets
+        self.keys = array('Q', bytes(8*size))
+        self.scores = array('d', bytes(8*size))
+        self.moves = array('H', bytes(2*size))
+        self.depths = array('b', bytes(size))
+        self.flags = array('B', bytes(size))
+        self.ages = array('B', bytes(size))
+        self.stored = 0
+
+    def newSearch(self):
+        '''
+        Called once per move searched, so entries from earlier searches are
+        recognised as stale and replaced first.
+        '''
+        self.age = (self.age + 1) & 255
+
+    def probe(self, key):
+        '''
+        RETURN
+        * (depth, flag, score, move) of the entry for `key`, or None if there
+        is none.  `move` is 0 when no best move was recorded.
+        '''
+        slot = 2*(key % self.buckets)
+        keys = self.keys
+        if keys[slot] != key:
+            slot += 1
+            if keys[slot] != key:
+                return None
+        return self.depths[slot], self.flags[slot], self.scores[slot], self.moves[slot]
+
+    def store(self, key, depth, flag, score, move):
+        '''
+        Records a search result for the position hashed to `key`, choosing
+        the slot of its bucket by the replacement scheme described above.
+        '''
+        slot = 2*(key % self.buckets)
+        if not (self.keys[slot] == key or self.keys[slot] == 0 or
+                self.ages[slot] != self.age or depth >= self.depths[slot]):
+            slot += 1
+        if self.keys[slot] == 0:
+            self.stored += 1
+        elif self.keys[slot] == key and not move:
+            # Keep the best move of a shallower search of this position
+            # rather than forgetting it.
+            move = self.moves[slot]
+        self.keys[slot] = key
+        self.depths[slot] = depth
+        self.flags[slot] = flag
+        self.scores[slot] = score
+        self.moves[slot] = move or 0
+        self.ages[slot] = self.age
+
+    def hashfull(self):
+        '''
+        RETURN
+        * fraction of slots in use
+        '''
+        return self.stored / len(self.keys)
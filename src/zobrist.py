@@ -0,0 +1,62 @@
+'''
+Zobrist hashing of board states.
+
+Each (piece code, square) pair is given a random 64-bit key, and a board's
+hash is the XOR of the keys of every occupied square, XOR-ed with `side_key`
+when black is to play.  Making a move only has to XOR out the old and in the
+new contents of the few squares it changes, so the hash is kept up to date
+incrementally from the undo records written by `movePiece`.
+
+Castling and en'passant state need no keys of their own here: castling
+rights are implied by the kings and rooks standing on their starting squares,
+and a pawn which may be captured en'passant carries its own piece code (`fP`).
+'''
+import random
+from chess import *
+
+# Seeded so hashes are reproducible between runs, and between processes which
+# share positions.
+_rng = random.Random(0x7410)
+
+# piece_keys[piece+8][sq] for every piece code on [-8,8].  The empty square
+# has all-zero keys so it drops out of every XOR.
+piece_keys = [[0 if piece == empty else _rng.getrandbits(64) for sq in range(64)]
+        for piece in range(-8, 9)]
+side_key = _rng.getrandbits(64)
+
+def hash_board(board, team):
+    '''
+    INPUT
+    board -- array shaped (8,8) containing a board state
+    team -- team to play
+
+    RETURN
+    key -- 64-bit Zobrist hash of the position, computed from scratch
+    '''
+    key = side_key if team == Bl else 0
+    for sq, piece in squares(board):
+        if piece != empty:
+            key ^= piece_keys[piece+8][sq]
+    return key
+
+def update_key(key, board, undo):
+    '''
+    INPUT
+    key -- hash of the position before the move
+    board -- board state after the move
+    undo -- the (array index, previous value) records of the move, as
+        written by `movePiece` or returned by `make_move`
+
+    RETURN
+    key -- hash of the position after the move, with the side to play flipped
+    '''
+    seen = []
+    for index, old in undo:
+        # A square written twice (a fresh pawn reverting and then moving)
+        # must only be updated from its original contents.
+        if index in seen:
+            continue
+        seen.append(index)
+        sq = 8*index[1] + index[0]
+        key ^= piece_keys[old+8][sq] ^ piece_keys[board[index]+8][sq]
+    return key ^ side_key